@@ -1,25 +1,77 @@
-from rest_framework.views import APIView
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.http import HttpResponse
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from CENDRA.async_views import AsyncAPIView, gather_blocking, run_blocking
+from CENDRA.cache import entity_scope, scoped_cache_key
+from CENDRA.metrics import render_metrics
 from apps.affiliate.models import Affiliate
+from apps.entity.models import Entity
 from apps.treasury.models import BankAccount, Income, Outcome
 from apps.treasury.serializers import BankAccountSerializer
 from apps.news.models import NewsItem
 
-class Dashboard(APIView):
-    def get(self, request, *args, **kwargs):
+def count_by_entity(queryset, entity_field='entity'):
+    """
+    Subquery counting the rows of the queryset that belong to the outer entity.
+    """
+    rows = queryset.filter(**{entity_field: OuterRef('pk')}).order_by().values(entity_field).annotate(count=Count('pk')).values('count')
+    return Subquery(rows, output_field=IntegerField())
+
+def get_entity_counters(entity_id):
+    return Entity.objects.filter(pk=entity_id).annotate(
+        members=count_by_entity(Affiliate.objects.all()),
+        news=count_by_entity(NewsItem.objects.all()),
+        incomes=count_by_entity(Income.objects.all(), 'account__entity'),
+        outcomes=count_by_entity(Outcome.objects.all(), 'account__entity'),
+    ).values('members', 'news', 'incomes', 'outcomes').get()
+
+def get_bank_accounts(entity_id):
+    return BankAccountSerializer(BankAccount.objects.filter(entity=entity_id), many=True).data
+
+def get_affiliate_name(user):
+    return user.affiliate.name
+
+async def get_entity_dashboard(entity_id):
+    """
+    Returns the entity-wide part of the dashboard, from the cache when possible.
+    """
+    key = await run_blocking(scoped_cache_key, entity_scope(entity_id), 'dashboard')
+    dashboard = await cache.aget(key)
+    if dashboard is None:
+        # The counters come from a single query on the entity, the accounts from a second one run concurrently
+        counters, bank_accounts = await gather_blocking((get_entity_counters, entity_id), (get_bank_accounts, entity_id))
+        dashboard = {
+            'members': counters['members'] or 0,
+            'news': counters['news'] or 0,
+            'bank_accounts': bank_accounts,
+            'movements': (counters['incomes'] or 0) + (counters['outcomes'] or 0),
+        }
+        await cache.aset(key, dashboard, settings.DASHBOARD_CACHE_TIMEOUT)
+    return dashboard
+
+class Dashboard(AsyncAPIView):
+    query_budget = 5
+    async def get(self, request, *args, **kwargs):
         """
         Returns basic information about the entity status.
         
         """
-        name = request.user.affiliate.name
-        members = Affiliate.objects.filter(entity=request.user.entity).count()
-        news = NewsItem.objects.filter(entity=request.user.entity).count()
-        bank = BankAccount.objects.filter(entity=request.user.entity.id)
-        serializer = BankAccountSerializer(bank, many=True)
-        
-        sum = 0
-        incomes = Income.objects.filter(account__entity=request.user.entity).count()
-        outcomes = Outcome.objects.filter(account__entity=request.user.entity).count()
-        sum += incomes + outcomes
+        name = await run_blocking(get_affiliate_name, request.user)
+        return Response({'name': name, **await get_entity_dashboard(request.user.entity_id)})
 
-        return Response({'name': name, 'members': members, 'news': news, 'bank_accounts': serializer.data, 'movements': sum})
+class Metrics(APIView):
+    query_budget = 2
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        """
+        Returns the request metrics of all server workers in Prometheus text format.
+
+        Only available to site administrators.
+        """
+        content, content_type = render_metrics()
+        return HttpResponse(content, content_type=content_type)
@@ -0,0 +1,98 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.functional import classproperty
+from rest_framework.views import APIView
+
+# Without workers, blocking calls run one after another in the request thread
+executor = ThreadPoolExecutor(settings.ASYNC_QUERY_WORKERS) if settings.ASYNC_QUERY_WORKERS else None
+
+def run_in_worker(function, *args):
+    # Worker threads hold their own connections, recycled like those of a request
+    close_old_connections()
+    try:
+        return function(*args)
+    finally:
+        close_old_connections()
+
+async def run_blocking(function, *args):
+    """
+    Runs a blocking call, such as an ORM query, without blocking the event loop.
+    """
+    if executor is None:
+        return await sync_to_async(function)(*args)
+    return await sync_to_async(run_in_worker, thread_sensitive=False, executor=executor)(function, *args)
+
+async def gather_blocking(*calls):
+    """
+    Runs independent blocking calls concurrently, each given as (function, *args).
+
+    Calls use their own database connections, so they can't see uncommitted
+    writes of the request.
+    """
+    if executor is None:
+        # The request thread runs a single call at a time
+        return [await run_blocking(*call) for call in calls]
+    return await asyncio.gather(*(run_blocking(*call) for call in calls))
+
+async def read_chunks(file, chunk_size):
+    try:
+        while True:
+            chunk = await sync_to_async(file.read, thread_sensitive=False)(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        file.close()
+
+def file_attachment_response(request, file, filename, content_type, chunk_size=64 * 1024):
+    """
+    Returns a file download, streamed asynchronously when served over ASGI.
+    """
+    if not isinstance(request._request, ASGIRequest):
+        # Django buffers async iterators when serving WSGI
+        return FileResponse(file, as_attachment=True, filename=filename, content_type=content_type)
+    response = StreamingHttpResponse(read_chunks(file, chunk_size), content_type=content_type)
+    response['Content-Disposition'] = 'attachment; filename="{0}"'.format(filename)
+    return response
+
+
+class AsyncAPIView(APIView):
+    """
+    APIView whose handlers may be coroutines.
+
+    Authentication, permissions and throttling are synchronous in DRF, so they
+    run in the request thread before awaiting the handler. Synchronous handlers
+    are still supported and run there too.
+    """
+
+    @classproperty
+    def view_is_async(cls):
+        return True
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            if iscoroutinefunction(handler):
+                response = await handler(request, *args, **kwargs)
+            else:
+                response = await sync_to_async(handler)(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
@@ -0,0 +1,132 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.utils.crypto import salted_hmac
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import BasicAuthentication, TokenAuthentication
+from rest_framework.authtoken.models import Token
+from apps.affiliate.models import Affiliate
+from apps.entity.models import Entity
+from apps.user.models import CendraUser
+
+
+class ExpiringLRUCache:
+    """
+    Thread-safe, size-bounded, in-process LRU cache whose entries expire after a TTL.
+    """
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def discard_if(self, predicate):
+        with self.lock:
+            for key in [key for key, (_, value) in self.entries.items() if predicate(value)]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+token_cache = ExpiringLRUCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TIMEOUT)
+credentials_cache = ExpiringLRUCache(settings.BASIC_AUTH_CACHE_SIZE, settings.BASIC_AUTH_CACHE_TIMEOUT)
+
+class CachedBasicAuthentication(BasicAuthentication):
+    """
+    Basic authentication that remembers recently verified credentials.
+
+    Checking a password runs the whole key derivation of the password hasher,
+    which is by design the most expensive part of a request. Verified
+    credentials are cached by their keyed HMAC, never in clear, for
+    BASIC_AUTH_CACHE_TIMEOUT seconds, and dropped as soon as this process sees
+    the user change, e.g. its password.
+    """
+    def authenticate_credentials(self, userid, password, request=None):
+        key = salted_hmac('CENDRA.authentication.CachedBasicAuthentication', userid + '\0' + password, algorithm='sha256').hexdigest()
+        user = credentials_cache.get(key)
+        if user is None:
+            user, _ = super().authenticate_credentials(userid, password, request)
+            credentials_cache.set(key, user)
+        return (copy.deepcopy(user), None)
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that keeps recently used tokens in memory.
+
+    The token is loaded together with its user, entity and affiliate, and every
+    request gets its own copy of that snapshot, so repeat callers authenticate
+    without queries. Entries expire after TOKEN_CACHE_TIMEOUT seconds and are
+    dropped as soon as this process sees the token, user, entity or affiliate
+    change.
+    """
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is None:
+            model = self.get_model()
+            try:
+                token = model.objects.select_related('user__entity', 'user__affiliate').get(key=key)
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            if not token.user.is_active:
+                raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+            token_cache.set(key, token)
+        token = copy.deepcopy(token)
+        return (token.user, token)
+
+
+def discard_users(predicate):
+    token_cache.discard_if(lambda token: predicate(token.user))
+    credentials_cache.discard_if(predicate)
+
+def discard_users_on_commit(attribute, value):
+    # Once the write is committed, so a request in between can't cache the previous rows again
+    transaction.on_commit(lambda: discard_users(lambda user: getattr(user, attribute) == value))
+
+def discard_token(sender, instance, **kwargs):
+    transaction.on_commit(partial(token_cache.discard, instance.key))
+
+def discard_user(sender, instance, **kwargs):
+    discard_users_on_commit('pk', instance.pk)
+
+def discard_entity_users(sender, instance, **kwargs):
+    discard_users_on_commit('entity_id', instance.pk)
+
+def discard_affiliate_users(sender, instance, **kwargs):
+    discard_users_on_commit('affiliate_id', instance.pk)
+
+post_delete.connect(discard_token, sender=Token)
+post_save.connect(discard_user, sender=CendraUser)
+post_delete.connect(discard_user, sender=CendraUser)
+post_save.connect(discard_entity_users, sender=Entity)
+post_save.connect(discard_affiliate_users, sender=Affiliate)
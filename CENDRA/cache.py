@@ -0,0 +1,97 @@
+import functools
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+PUBLIC_SCOPE = 'public'
+
+def entity_scope(entity_id):
+    return 'entity:{0}'.format(entity_id)
+
+def get_cache_version(scope):
+    """
+    Returns the current version of a cache scope.
+
+    Versions are never reused, so an evicted version key can't bring back
+    responses cached before the last write.
+    """
+    key = 'version:{0}'.format(scope)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+def bump_cache_version(scope):
+    """
+    Invalidates at once every response cached under the scope.
+    """
+    cache.set('version:{0}'.format(scope), time.time_ns(), None)
+
+def scoped_cache_key(scope, *parts):
+    return ':'.join([scope, str(get_cache_version(scope))] + [str(part) for part in parts])
+
+def request_entity_scope(request):
+    return entity_scope(request.user.entity_id)
+
+def request_public_scope(request):
+    return PUBLIC_SCOPE
+
+def cache_response(scope=request_entity_scope, timeout=None):
+    """
+    Caches the data of successful responses of an APIView handler.
+
+    Responses are cached per path and query string under the version of the
+    scope returned by 'scope(request)', the requesting user entity by default.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(self, request, *args, **kwargs):
+            query = hashlib.md5(request.get_full_path().encode('utf-8')).hexdigest()
+            key = scoped_cache_key(scope(request), 'response', query)
+            data = cache.get(key)
+            if data is not None:
+                return Response(data)
+            response = handler(self, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK and isinstance(response, Response):
+                cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT if timeout is None else timeout)
+            return response
+        return wrapper
+    return decorator
+
+def conditional_response(queryset, scope=request_entity_scope):
+    """
+    Answers conditional GET requests of an APIView handler.
+
+    The ETag and Last-Modified headers are derived from the last 'updated_at'
+    and the row count of the queryset returned by 'queryset(request)', and from
+    the version of the cache scope, which also changes on deletions and on
+    writes to related models. If the client copy is still fresh the handler is
+    not called and an empty 304 Not Modified response is returned.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(self, request, *args, **kwargs):
+            version = get_cache_version(scope(request))
+            fingerprint = queryset(request).aggregate(updated_at=Max('updated_at'), count=Count('pk'))
+            etag = hashlib.md5('{0}:{1}:{2}:{3}:{4}'.format(
+                scope(request), version, fingerprint['updated_at'], fingerprint['count'], request.get_full_path()
+            ).encode('utf-8')).hexdigest()
+            last_modified = version // 10 ** 9
+            if fingerprint['updated_at'] is not None:
+                last_modified = max(last_modified, int(fingerprint['updated_at'].timestamp()))
+            response = get_conditional_response(request, etag=quote_etag(etag), last_modified=last_modified)
+            if response is None:
+                response = handler(self, request, *args, **kwargs)
+            if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+                response['ETag'] = quote_etag(etag)
+                response['Last-Modified'] = http_date(last_modified)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,247 @@
+import functools
+from collections import OrderedDict
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import ISO_8601, relations, serializers
+from rest_framework.settings import api_settings
+from CENDRA.images import variant_url
+from CENDRA.utils import ImageVariantField
+
+# Fields whose to_representation only depends on the value, called as they are
+PLAIN_FIELDS = (
+    serializers.BooleanField,
+    serializers.ChoiceField,
+    serializers.DateTimeField,
+    serializers.DecimalField,
+    serializers.FloatField,
+)
+
+def get_model_field(model, path):
+    """
+    Returns the model field at the end of a lookup path, or None if it is not a path of single-valued fields.
+    """
+    field = None
+    for name in path.split('__'):
+        if model is None:
+            return None
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if field.many_to_many or field.one_to_many:
+            return None
+        model = field.related_model
+    return field
+
+def constant(converter):
+    return lambda context: converter
+
+def identity(value):
+    return value
+
+def date_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATE_FORMAT)
+    if output_format is None:
+        return identity
+    if output_format.lower() == ISO_8601:
+        return lambda value: value if isinstance(value, str) else value.isoformat()
+    return lambda value: value if isinstance(value, str) else value.strftime(output_format)
+
+def file_converter(field, model_field, context):
+    request = context.get('request')
+    use_url = getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL)
+    def convert(name):
+        field_file = model_field.attr_class(None, model_field, name)
+        if not field_file:
+            return None
+        if not use_url:
+            return field_file.name
+        url = field_file.url
+        return request.build_absolute_uri(url) if request is not None else url
+    return convert
+
+def variant_converter(field, model_field, context):
+    request = context.get('request')
+    def convert(name):
+        url = variant_url(model_field.attr_class(None, model_field, name), field.variant)
+        if url is not None and request is not None:
+            return request.build_absolute_uri(url)
+        return url
+    return convert
+
+def field_converter(field, model_field):
+    """
+    Returns a function of the serializer context returning the converter of the field values.
+
+    Returns None if the field is not supported.
+    """
+    field_type = type(field)
+    if field_type is serializers.IntegerField:
+        return constant(int)
+    if field_type in (serializers.CharField, serializers.EmailField):
+        return constant(str)
+    if field_type is serializers.ReadOnlyField:
+        return constant(identity)
+    if field_type is relations.PrimaryKeyRelatedField and field.pk_field is None:
+        # Values of a foreign key column are already the primary key
+        return constant(identity)
+    if field_type is serializers.DateField:
+        return constant(date_converter(field))
+    if field_type in PLAIN_FIELDS:
+        return constant(field.to_representation)
+    if model_field is None or not hasattr(model_field, 'attr_class'):
+        return None
+    if field_type in (serializers.FileField, serializers.ImageField):
+        return functools.partial(file_converter, field, model_field)
+    if field_type is ImageVariantField:
+        return functools.partial(variant_converter, field, model_field)
+    return None
+
+
+class NestedPlan:
+    """
+    Field plan of a nested serializer, whose relation is missing when the 'key' column is None.
+
+    A missing relation is serialized as None, as DRF does for both null foreign
+    keys and missing reverse one-to-ones.
+    """
+    def __init__(self, key, plan):
+        self.key = key
+        self.plan = plan
+
+    def bind(self, context):
+        converters = bind_plan(self.plan, context)
+        key = self.key
+        def convert(row):
+            if row[key] is None:
+                return None
+            return to_representation(row, converters)
+        return convert
+
+def bind_plan(plan, context):
+    converters = []
+    for name, column, converter in plan:
+        if isinstance(converter, NestedPlan):
+            converters.append((name, None, converter.bind(context)))
+        else:
+            converters.append((name, column, converter(context)))
+    return converters
+
+def to_representation(row, converters):
+    data = OrderedDict()
+    for name, column, convert in converters:
+        if column is None:
+            value = convert(row)
+        else:
+            value = row[column]
+            if value is not None:
+                value = convert(value)
+        data[name] = value
+    return data
+
+def compile_fields(serializer, prefix, columns):
+    """
+    Returns the field plan of the serializer, whose values are read from the
+    'columns' of values() rows, or None if a field is not supported.
+
+    Fields are read from their source, or from the path declared in
+    'field_sources', which can also name an annotation.
+    """
+    plan = []
+    model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+    field_sources = getattr(serializer, 'field_sources', {})
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, serializers.BaseSerializer):
+            relation = get_model_field(model, field.source) if isinstance(field, serializers.ModelSerializer) else None
+            if relation is None or not relation.is_relation:
+                return None
+            nested = compile_fields(field, prefix + field.source + '__', columns)
+            if nested is None:
+                return None
+            key = prefix + field.source + '__' + relation.related_model._meta.pk.name
+            columns.append(key)
+            plan.append((name, None, NestedPlan(key, nested)))
+            continue
+        if name in field_sources:
+            paths = field_sources[name]
+            if len(paths) != 1:
+                return None
+            model_field = get_model_field(model, paths[0])
+        else:
+            paths = (field.source,)
+            model_field = get_model_field(model, field.source)
+            if model is not None and model_field is None:
+                return None
+        if field.source == '*' or '.' in paths[0]:
+            return None
+        converter = field_converter(field, model_field)
+        if converter is None:
+            return None
+        column = prefix + paths[0]
+        columns.append(column)
+        plan.append((name, column, converter))
+    return plan
+
+
+class CompiledSerializer:
+    """
+    Read-only serializer of values() rows, with the same output as the serializer it is compiled from.
+
+    The serializer builds and converts every field of every instance through
+    its field objects. The compiled plan reads each column of the row once and
+    converts it with a function chosen when compiling.
+    """
+    def __init__(self, columns, plan):
+        self.columns = columns
+        self.plan = plan
+
+    def values(self, queryset, extra=()):
+        """
+        Returns the queryset as rows holding the columns of the plan and the 'extra' ones.
+        """
+        return queryset.values(*dict.fromkeys(list(self.columns) + list(extra)))
+
+    def serialize(self, rows, context=None):
+        converters = bind_plan(self.plan, context or {})
+        return [to_representation(row, converters) for row in rows]
+
+@functools.lru_cache(maxsize=256)
+def compile_cached(serializer_class, fields, expand):
+    kwargs = {}
+    if fields is not None:
+        kwargs['fields'] = fields
+    if expand:
+        kwargs['expand'] = expand
+    columns = []
+    plan = compile_fields(serializer_class(**kwargs), '', columns)
+    if plan is None:
+        return None
+    return CompiledSerializer(tuple(dict.fromkeys(columns)), plan)
+
+def compile_serializer(serializer_class, fields=None, expand=()):
+    """
+    Returns the compiled serializer of the selected fields, or None if some field is not supported.
+
+    The plans are cached per serializer class and field selection.
+    """
+    return compile_cached(serializer_class, None if fields is None else frozenset(fields), tuple(expand))
+
+def serialize_list(serializer_class, queryset, fields=None, expand=(), paginator=None, request=None, context=None):
+    """
+    Returns the data of the queryset, or of the page of it selected by the paginator.
+
+    The compiled serializer is used when it supports the selected fields, the
+    serializer itself otherwise.
+    """
+    extra = [field.lstrip('-') for field in paginator.ordering] if paginator is not None else []
+    compiled = compile_serializer(serializer_class, fields, expand)
+    if compiled is not None:
+        rows = compiled.values(queryset, extra)
+    else:
+        rows = serializer_class.restrict_queryset(queryset, fields, expand, extra)
+    if paginator is not None:
+        rows = paginator.paginate_queryset(rows, request)
+    if compiled is not None:
+        return compiled.serialize(rows, context)
+    return serializer_class(rows, many=True, fields=fields, expand=expand, context=context or {}).data
@@ -0,0 +1,23 @@
+from django.db.backends.sqlite3 import base
+
+
+def apply_pragmas(conn, pragmas):
+    for pragma, value in pragmas.items():
+        conn.execute('PRAGMA {0} = {1}'.format(pragma, value))
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite backend tuned for concurrent workers.
+
+    Applies the PRAGMAS of the database settings to every new connection and,
+    with TRANSACTION_MODE = 'IMMEDIATE', takes the write lock when a
+    transaction begins: a transaction that reads and then writes can't then
+    fail with 'database is locked', it waits for busy_timeout instead.
+    """
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        apply_pragmas(conn, self.settings_dict.get('PRAGMAS', {}))
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN {0}'.format(self.settings_dict.get('TRANSACTION_MODE', 'DEFERRED')))
@@ -1,4 +1,92 @@
-timeout = 3
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+
+# Worker model, chosen with DJANGO_SERVER_MODE:
+#  - sync: one request at a time per process, the default
+#  - gthread: a pool of DJANGO_THREADS threads per process, for I/O bound traffic
+#  - asgi: CENDRA.asgi served by uvicorn workers, so async views can wait on
+#    queries and slow clients without holding a thread. Every middleware in
+#    settings.MIDDLEWARE must be async-capable for that, or Django runs the
+#    whole chain in a thread again (logged in debug mode on django.request)
+server_mode = os.environ.get('DJANGO_SERVER_MODE', 'sync')
+cores = multiprocessing.cpu_count()
+
+if server_mode == 'asgi':
+    wsgi_app = 'CENDRA.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+    default_workers = cores
+    os.environ.setdefault('DJANGO_ASYNC_QUERY_WORKERS', '4')
+elif server_mode == 'gthread':
+    worker_class = 'gthread'
+    threads = int(os.environ.get('DJANGO_THREADS', 4))
+    default_workers = cores + 1
+else:
+    worker_class = 'sync'
+    default_workers = cores * 2 + 1
+
+workers = int(os.environ.get('DJANGO_WORKERS', default_workers))
+
+# Load the application before forking, so workers share its memory copy-on-write
+preload_app = True
+
+# Recycle workers periodically to bound slow memory growth, staggered so they don't all restart at once
+max_requests = int(os.environ.get('DJANGO_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('DJANGO_MAX_REQUESTS_JITTER', 100))
+
+timeout = int(os.environ.get('DJANGO_WORKER_TIMEOUT', 30))
+
+# Workers write their request metrics here, so /api/private/metrics can aggregate all of them.
+# It must be set before the application, and so prometheus_client, is loaded.
+metrics_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'cendra-metrics'))
+
+# Routes allowed to run up to DJANGO_LONG_TIMEOUT seconds, such as exports
+long_routes = re.compile(os.environ.get('DJANGO_LONG_ROUTES', r'^/api/private/(affiliates/export|affiliates/import|entity/census)$'))
+long_timeout = int(os.environ.get('DJANGO_LONG_TIMEOUT', 300))
+
+
+class Heartbeat(threading.Thread):
+    """
+    Keeps a worker from being killed by the arbiter while it serves a long route.
+
+    Sync workers only notify the arbiter between requests, so a request lasting
+    longer than the timeout gets the worker killed unless something else does.
+    """
+
+    def __init__(self, worker, duration):
+        super().__init__(daemon=True)
+        self.worker = worker
+        self.deadline = time.monotonic() + duration
+        self.finished = threading.Event()
+
+    def run(self):
+        while not self.finished.wait(timeout / 3) and time.monotonic() < self.deadline:
+            self.worker.notify()
+
+def on_starting(server):
+    # Metrics of a previous run would be added to the new ones
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+def pre_request(worker, req):
+    # Threaded and async workers keep notifying the arbiter while requests run
+    if worker_class == 'sync' and long_routes.match(req.path):
+        worker.heartbeat = Heartbeat(worker, long_timeout - timeout)
+        worker.heartbeat.start()
+
+def post_request(worker, req, environ, resp):
+    heartbeat = getattr(worker, 'heartbeat', None)
+    if heartbeat is not None:
+        heartbeat.finished.set()
+        worker.heartbeat = None
 
 __code_dump_stack__ = """
 import sys, traceback
@@ -20,4 +108,4 @@ def dump_stack_for_process(pid):
 def worker_abort(worker):
     pid = worker.pid
     print("worker is being killed - {}".format(pid))
-    dump_stack_for_process(pid)
\ No newline at end of file
+    dump_stack_for_process(pid)
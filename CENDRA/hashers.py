@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 hasher with the number of iterations set by PASSWORD_ITERATIONS.
+
+    It keeps the 'pbkdf2_sha256' algorithm name, so it verifies every existing
+    hash and re-encodes it with the configured iterations on the next login.
+    """
+    iterations = getattr(settings, 'PASSWORD_ITERATIONS', None) or PBKDF2PasswordHasher.iterations
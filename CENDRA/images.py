@@ -0,0 +1,138 @@
+import logging
+import os
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import models, transaction
+from django.db.models.signals import post_save
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(max_workers=settings.IMAGE_VARIANT_WORKERS, thread_name_prefix='image-variants')
+
+def variant_suffix(variant):
+    return '_{0}.{1}'.format(variant, settings.IMAGE_VARIANT_FORMAT.lower())
+
+def variant_name(name, variant):
+    root, _ = os.path.splitext(name)
+    return root + variant_suffix(variant)
+
+def variant_url(field_file, variant):
+    """
+    Returns the URL of a variant of the image, or the original URL for the default image.
+
+    The URL is derived from the name alone, without checking the storage, as
+    variants are generated when the image is uploaded. Until they are, the
+    media view serves the original instead, see variant_source().
+    """
+    if not field_file:
+        return None
+    if field_file.name == field_file.field.default:
+        return field_file.url
+    return field_file.storage.url(variant_name(field_file.name, variant))
+
+def variant_source(storage, name):
+    """
+    Returns the name of the image a variant name was derived from, or None.
+
+    Only called when a variant is missing, i.e. while it is being generated,
+    or for images uploaded before variants existed.
+    """
+    directory, filename = posixpath.split(name)
+    for variant in settings.IMAGE_VARIANTS:
+        if filename.endswith(variant_suffix(variant)):
+            root = filename[:-len(variant_suffix(variant))]
+            try:
+                _, files = storage.listdir(directory)
+            except FileNotFoundError:
+                return None
+            for candidate in sorted(files):
+                if os.path.splitext(candidate)[0] == root and candidate != filename:
+                    return posixpath.join(directory, candidate)
+    return None
+
+def generate_variants(storage, name):
+    """
+    Stores the resized copies of an image defined in IMAGE_VARIANTS.
+
+    Orientation is applied to the pixels first, so dropping the EXIF metadata
+    (camera, location, ...) does not rotate the result.
+    """
+    with storage.open(name) as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image.load()
+    image_format = settings.IMAGE_VARIANT_FORMAT
+    if image_format == 'JPEG' or image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGB' if image_format == 'JPEG' else 'RGBA')
+    for variant, (width, height, crop) in settings.IMAGE_VARIANTS.items():
+        if crop:
+            resized = ImageOps.fit(image, (width, height), Image.LANCZOS)
+        else:
+            resized = image.copy()
+            resized.thumbnail((width, height), Image.LANCZOS)
+        output = BytesIO()
+        resized.save(output, image_format, quality=settings.IMAGE_VARIANT_QUALITY)
+        target = variant_name(name, variant)
+        storage.delete(target)
+        storage.save(target, ContentFile(output.getvalue()))
+
+def delete_variants(storage, name):
+    for variant in settings.IMAGE_VARIANTS:
+        storage.delete(variant_name(name, variant))
+
+def generate_variants_safely(storage, name, replaced=None):
+    try:
+        generate_variants(storage, name)
+        if replaced is not None:
+            delete_variants(storage, replaced)
+    except Exception:
+        logger.exception('Could not generate the variants of %s', name)
+
+class VariantImageField(models.ImageField):
+    """
+    ImageField that generates the IMAGE_VARIANTS of every newly uploaded image.
+
+    Variants are generated by a worker thread once the transaction commits, so
+    the upload request does not wait for the resizing. The variants of the
+    image it replaces are deleted then.
+
+    Upload paths include the primary key, so an image uploaded along with a
+    new instance is stored once the instance is saved and has one.
+    """
+    def contribute_to_class(self, cls, name, **kwargs):
+        super().contribute_to_class(cls, name, **kwargs)
+        if not cls._meta.abstract:
+            post_save.connect(self.save_pending_upload, sender=cls)
+
+    def save_pending_upload(self, sender, instance, raw=False, **kwargs):
+        pending = instance.__dict__.get('_pending_uploads', {})
+        if not raw and self.attname in pending:
+            setattr(instance, self.attname, pending.pop(self.attname))
+            instance.save(update_fields=[self.attname])
+
+    def get_replaced_name(self, model_instance):
+        if model_instance.pk is None:
+            return None
+        name = type(model_instance)._base_manager.filter(pk=model_instance.pk).values_list(self.attname, flat=True).first()
+        if not name or name == self.default:
+            return None
+        return name
+
+    def pre_save(self, model_instance, add):
+        field_file = getattr(model_instance, self.attname)
+        uploaded = field_file and not field_file._committed
+        if uploaded and model_instance.pk is None:
+            model_instance.__dict__.setdefault('_pending_uploads', {})[self.attname] = field_file.file
+            setattr(model_instance, self.attname, self.get_default())
+            return super().pre_save(model_instance, add)
+        replaced = self.get_replaced_name(model_instance) if uploaded and not add else None
+        field_file = super().pre_save(model_instance, add)
+        if uploaded:
+            storage, name = field_file.storage, field_file.name
+            if replaced == name:
+                replaced = None
+            transaction.on_commit(lambda: executor.submit(generate_variants_safely, storage, name, replaced))
+        return field_file
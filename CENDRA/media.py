@@ -0,0 +1,154 @@
+import mimetypes
+import os
+import posixpath
+import re
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework.permissions import AllowAny
+from rest_framework.views import APIView
+from CENDRA.images import variant_source
+from apps.affiliate.models import Affiliate
+from apps.news.models import NewsItem
+
+# Media readable by anyone: default images and entity logos, listed by the public API
+PUBLIC_MEDIA = re.compile(r'^([^/]+|avatar/entity/\d+/[^/]+)$')
+# Media readable by the members of the entity owning the object
+PROTECTED_MEDIA = (
+    (re.compile(r'^avatar/user/(?P<pk>\d+)/[^/]+$'), Affiliate),
+    (re.compile(r'^news/(?P<pk>\d+)/[^/]+$'), NewsItem),
+)
+RANGE_HEADER = re.compile(r'^bytes=(?P<start>\d*)-(?P<end>\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+def read_range(file, start, length):
+    try:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+def parse_range(header, size):
+    """
+    Returns the (start, end) bytes of a single range request, None if it is not satisfiable.
+    """
+    match = RANGE_HEADER.match(header)
+    if match is None or not (match['start'] or match['end']):
+        return None
+    if match['start']:
+        start = int(match['start'])
+        end = min(int(match['end']), size - 1) if match['end'] else size - 1
+    else:
+        start = max(size - int(match['end']), 0)
+        end = size - 1
+    if start > end:
+        return None
+    return start, end
+
+def add_cache_control(response, public, revalidate=False):
+    # Files of an entity must not be stored by shared caches
+    visibility = 'public' if public else 'private'
+    if revalidate:
+        patch_cache_control(response, no_cache=True, **{visibility: True})
+    else:
+        patch_cache_control(response, max_age=settings.MEDIA_CACHE_MAX_AGE, **{visibility: True})
+
+def file_response(request, path, public, revalidate=False):
+    """
+    Serves a file with validators, caching headers and single range support.
+
+    Full responses go through FileResponse, which lets the WSGI server use
+    sendfile(), so the file is never copied through Python.
+    """
+    stat = os.stat(path)
+    etag = quote_etag('{0:x}-{1:x}'.format(stat.st_mtime_ns, stat.st_size))
+    last_modified = int(stat.st_mtime)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        content_type, encoding = mimetypes.guess_type(path)
+        content_type = content_type or 'application/octet-stream'
+        requested_range = request.META.get('HTTP_RANGE')
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if requested_range and (not if_range or if_range == etag):
+            byte_range = parse_range(requested_range, stat.st_size)
+            if byte_range is None:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = 'bytes */{0}'.format(stat.st_size)
+                return response
+            start, end = byte_range
+            response = StreamingHttpResponse(read_range(open(path, 'rb'), start, end - start + 1), status=206, content_type=content_type)
+            response['Content-Range'] = 'bytes {0}-{1}/{2}'.format(start, end, stat.st_size)
+            response['Content-Length'] = end - start + 1
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+        if encoding:
+            response['Content-Encoding'] = encoding
+        response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    add_cache_control(response, public, revalidate)
+    return response
+
+class MediaFile(APIView):
+    permission_classes = [AllowAny]
+
+    def perform_content_negotiation(self, request, force=False):
+        # Media clients ask for images, never for one of the API renderers
+        return super().perform_content_negotiation(request, force=True)
+
+    def check_access(self, request, path):
+        """
+        Returns whether the file is public, raising if the user can't read it.
+        """
+        if PUBLIC_MEDIA.match(path):
+            return True
+        for pattern, model in PROTECTED_MEDIA:
+            match = pattern.match(path)
+            if match:
+                if not request.user.is_authenticated:
+                    self.permission_denied(request)
+                if not model.objects.filter(pk=match['pk'], entity=request.user.entity_id).exists():
+                    raise Http404
+                return False
+        raise Http404
+
+    def get(self, request, path, *args, **kwargs):
+        """
+        Serves an uploaded file, after checking the user can read it.
+
+        Depending on MEDIA_SERVE_MODE the file is sent by the front proxy
+        ('x-accel' for nginx, 'x-sendfile' for Apache and lighttpd) or by Django.
+        Image variants not generated yet are replaced by their original image,
+        which clients must revalidate.
+        """
+        path = posixpath.normpath(path).lstrip('/')
+        public = self.check_access(request, path)
+        try:
+            full_path = safe_join(settings.MEDIA_ROOT, path)
+        except SuspiciousFileOperation:
+            raise Http404
+        revalidate = False
+        if not os.path.isfile(full_path):
+            path = variant_source(default_storage, path)
+            if path is None:
+                raise Http404
+            full_path = safe_join(settings.MEDIA_ROOT, path)
+            revalidate = True
+        if settings.MEDIA_SERVE_MODE in ('x-accel', 'x-sendfile'):
+            response = HttpResponse(content_type=mimetypes.guess_type(full_path)[0] or 'application/octet-stream')
+            if settings.MEDIA_SERVE_MODE == 'x-accel':
+                response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + path
+            else:
+                response['X-Sendfile'] = full_path
+            add_cache_control(response, public, revalidate)
+            return response
+        return file_response(request, full_path, public, revalidate)
@@ -0,0 +1,169 @@
+import contextvars
+import os
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+from CENDRA.query_budget import check_query_budget, get_query_budget, report_query_budget
+
+# Route label of requests that didn't match any URL pattern, so scans can't add labels
+UNMATCHED_ROUTE = '<unmatched>'
+
+REQUEST_DURATION = Histogram(
+    'cendra_request_duration_seconds', 'Wall time of requests.',
+    ('method', 'route', 'status'),
+)
+REQUEST_DB_QUERIES = Histogram(
+    'cendra_request_db_queries', 'Database queries run by requests.',
+    ('method', 'route'), buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 200, float('inf')),
+)
+REQUEST_DB_DURATION = Histogram(
+    'cendra_request_db_duration_seconds', 'Time requests spent waiting on the database.',
+    ('method', 'route'),
+)
+REQUEST_SERIALIZATION_DURATION = Histogram(
+    'cendra_request_serialization_seconds', 'Time spent rendering the response data.',
+    ('method', 'route'),
+)
+QUERY_BUDGET_VIOLATIONS = Counter(
+    'cendra_query_budget_violations', 'Requests that ran more queries than the budget of their view.',
+    ('method', 'route'),
+)
+
+# Timer of the request being served, copied into the threads running its blocking calls
+current_timer = contextvars.ContextVar('current_timer', default=None)
+
+
+class RequestTimer:
+    def __init__(self, request):
+        self.start = time.perf_counter()
+        self.method = request.method
+        self.path = request.path
+        self.query_budget = None
+        # The statements are only kept to report budget violations
+        self.queries = [] if settings.QUERY_BUDGET_ACTION != 'record' else None
+        self.db_queries = 0
+        self.db_duration = 0.0
+        self.serialization_start = None
+        self.serialization_duration = 0.0
+
+    @property
+    def over_budget(self):
+        return self.query_budget is not None and self.db_queries > self.query_budget
+
+    def server_timing(self, duration):
+        return 'total;dur={0:.1f}, db;dur={1:.1f};desc="{2} queries", serialize;dur={3:.1f}'.format(
+            duration * 1000, self.db_duration * 1000, self.db_queries, self.serialization_duration * 1000
+        )
+
+def time_query(execute, sql, params, many, context):
+    timer = current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    if timer.query_budget is not None and timer.db_queries >= timer.query_budget:
+        check_query_budget(timer, sql)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.db_queries += 1
+        timer.db_duration += time.perf_counter() - start
+        if timer.queries is not None:
+            timer.queries.append(sql)
+
+def install_query_timer(sender, connection, **kwargs):
+    # Every connection gets the wrapper, so queries sent from worker threads are counted too
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+connection_created.connect(install_query_timer)
+
+def get_route(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None or match.route is None:
+        return UNMATCHED_ROUTE
+    return '/' + match.route
+
+
+class PerformanceMiddleware:
+    """
+    Records the wall, database and serialization time of every request.
+
+    The timings are sent back in a Server-Timing header (unless SERVER_TIMING is
+    off) and added to per-route histograms, exposed by the metrics endpoint.
+    Serialization is the rendering of the response data, which DRF runs once
+    the view has returned. Requests running more queries than the query_budget
+    of their view are handled as set by QUERY_BUDGET_ACTION.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timer = RequestTimer(request)
+        token = current_timer.set(timer)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timer.reset(token)
+        return self.record(request, timer, response)
+
+    async def __acall__(self, request):
+        timer = RequestTimer(request)
+        token = current_timer.set(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timer.reset(token)
+        return self.record(request, timer, response)
+
+    def record(self, request, timer, response):
+        duration = time.perf_counter() - timer.start
+        method, route = request.method, get_route(request)
+        REQUEST_DURATION.labels(method, route, response.status_code).observe(duration)
+        REQUEST_DB_QUERIES.labels(method, route).observe(timer.db_queries)
+        REQUEST_DB_DURATION.labels(method, route).observe(timer.db_duration)
+        REQUEST_SERIALIZATION_DURATION.labels(method, route).observe(timer.serialization_duration)
+        if timer.over_budget:
+            QUERY_BUDGET_VIOLATIONS.labels(method, route).inc()
+            report_query_budget(timer)
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = timer.server_timing(duration)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timer = current_timer.get()
+        if timer is not None:
+            timer.query_budget = get_query_budget(view_func)
+
+    def process_template_response(self, request, response):
+        # Called right before the response is rendered
+        timer = current_timer.get()
+        if timer is not None:
+            timer.serialization_start = time.perf_counter()
+            response.add_post_render_callback(lambda rendered: self.end_serialization(timer))
+        return response
+
+    @staticmethod
+    def end_serialization(timer):
+        timer.serialization_duration += time.perf_counter() - timer.serialization_start
+
+def get_registry():
+    """
+    Returns the registry to export, aggregating all worker processes if gunicorn runs several.
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+def render_metrics():
+    return generate_latest(get_registry()), CONTENT_TYPE_LATEST
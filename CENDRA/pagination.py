@@ -0,0 +1,180 @@
+import base64
+import datetime
+import decimal
+import json
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import ParseError
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination:
+    """
+    Cursor pagination over a fixed, unique ordering.
+
+    Unlike offset pagination, every page is fetched with a single indexed range
+    query, so its cost does not depend on how deep into the list the client is.
+    NULL values are treated as the smallest ones (SQLite semantics), so nullable
+    columns can be part of the ordering.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 100
+    max_page_size = 500
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, ordering, page_size=None):
+        self.ordering = tuple(ordering)
+        if page_size is not None:
+            self.page_size = page_size
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        """
+        Returns the ordering values encoded in the cursor query param, or None.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+        except (TypeError, ValueError, UnicodeError):
+            raise ParseError(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise ParseError(self.invalid_cursor_message)
+        return position
+
+    def encode_cursor(self, position):
+        data = json.dumps(position, default=self.encode_value, separators=(',', ':'))
+        return base64.urlsafe_b64encode(data.encode('ascii')).decode('ascii')
+
+    @staticmethod
+    def encode_value(value):
+        # Keep full precision: truncated timestamps would skip or repeat rows
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            return value.isoformat()
+        if isinstance(value, decimal.Decimal):
+            return str(value)
+        raise TypeError('Unsupported cursor value: %r' % (value,))
+
+    def get_order_by(self):
+        order_by = []
+        for field in self.ordering:
+            if field.startswith('-'):
+                order_by.append(F(field[1:]).desc(nulls_last=True))
+            else:
+                order_by.append(F(field).asc(nulls_first=True))
+        return order_by
+
+    def get_cursor_filter(self, position):
+        """
+        Builds the condition matching the rows strictly after the given position.
+        """
+        condition = Q(pk__in=[])
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            descending = field.startswith('-')
+            name = field.lstrip('-')
+            if descending:
+                if value is None:
+                    after = Q(pk__in=[])
+                else:
+                    after = Q(**{name + '__lt': value}) | Q(**{name + '__isnull': True})
+            else:
+                if value is None:
+                    after = Q(**{name + '__isnull': False})
+                else:
+                    after = Q(**{name + '__gt': value})
+            condition |= equal & after
+            if value is None:
+                equal &= Q(**{name + '__isnull': True})
+            else:
+                equal &= Q(**{name: value})
+        return condition
+
+    @staticmethod
+    def get_ordering_field(queryset, name):
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        if name == 'pk':
+            return queryset.model._meta.pk
+        try:
+            return queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+
+    def clean_position(self, queryset, position):
+        """
+        Converts the cursor values to the types of the ordering fields.
+
+        Raises ParseError if a value is not valid for its field, e.g. a
+        tampered cursor, instead of failing when the query runs.
+        """
+        cleaned = []
+        for field, value in zip(self.ordering, position):
+            model_field = self.get_ordering_field(queryset, field.lstrip('-'))
+            if value is not None and model_field is not None:
+                try:
+                    value = model_field.to_python(value)
+                    model_field.run_validators(value)
+                    # SQLite does not validate integer ranges, but fails to bind integers over 64 bits
+                    if isinstance(value, int) and not -2 ** 63 <= value < 2 ** 63:
+                        raise ValueError(value)
+                except (ValidationError, TypeError, ValueError):
+                    raise ParseError(self.invalid_cursor_message)
+            cleaned.append(value)
+        return cleaned
+
+    def apply_cursor(self, queryset, position):
+        if position is not None:
+            queryset = queryset.filter(self.get_cursor_filter(self.clean_position(queryset, position)))
+        return queryset
+
+    def get_position(self, item):
+        position = []
+        for field in self.ordering:
+            name = field.lstrip('-')
+            if isinstance(item, dict):
+                position.append(item[name])
+            else:
+                position.append(getattr(item, 'pk' if name == 'pk' else name))
+        return position
+
+    def paginate_queryset(self, queryset, request):
+        """
+        Returns the requested page of the queryset as a list.
+        """
+        position = self.decode_cursor(request)
+        queryset = self.apply_cursor(queryset, position).order_by(*self.get_order_by())
+        return self.paginate_ordered(queryset, request)
+
+    def paginate_ordered(self, queryset, request):
+        """
+        Slices a queryset, already filtered by the cursor and ordered, into a page.
+        """
+        self.request = request
+        page_size = self.get_page_size(request)
+        results = list(queryset[:page_size + 1])
+        self.next_position = None
+        if len(results) > page_size:
+            results = results[:page_size]
+            self.next_position = self.get_position(results[-1])
+        return results
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
@@ -0,0 +1,42 @@
+import logging
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+def get_query_budget(view_func):
+    """
+    Returns the query budget of the view serving a request, or None.
+
+    The budget is the 'query_budget' attribute of the view class, which covers
+    all its handlers. None means no limit.
+    """
+    view_class = getattr(view_func, 'view_class', None)
+    return getattr(view_class, 'query_budget', None)
+
+def format_queries(queries):
+    return '\n'.join('{0}. {1}'.format(number, sql) for number, sql in enumerate(queries, start=1))
+
+def check_query_budget(timer, sql):
+    """
+    Called before each query of a request, once its budget is spent.
+
+    Depending on QUERY_BUDGET_ACTION, raises QueryBudgetExceeded with every
+    query run so far, or lets the query run. 'log' reports the queries once
+    the request is over, and every mode records the violation in the metrics.
+    """
+    if settings.QUERY_BUDGET_ACTION == 'raise':
+        raise QueryBudgetExceeded('{0} {1} exceeds its budget of {2} queries:\n{3}'.format(
+            timer.method, timer.path, timer.query_budget, format_queries(timer.queries + [sql])
+        ))
+
+def report_query_budget(timer):
+    """
+    Logs the queries of a request over budget, with QUERY_BUDGET_ACTION 'log'.
+    """
+    if settings.QUERY_BUDGET_ACTION == 'log':
+        logger.warning('%s %s ran %d queries, its budget is %d:\n%s',
+                       timer.method, timer.path, timer.db_queries, timer.query_budget, format_queries(timer.queries))
@@ -0,0 +1,99 @@
+import re
+import unicodedata
+from django.db import connections, models
+from django.db.models.expressions import RawSQL
+
+WORD = re.compile(r'\w+')
+
+def fold(text):
+    """
+    Lowercases the text and strips its accents, so 'Núñez' and 'nunez' compare equal.
+    """
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+def search_terms(text):
+    return WORD.findall(fold(text))
+
+def fts_match(terms):
+    # Quoted prefix queries: every term must start a word, whatever FTS5 syntax it contains
+    return ' '.join('"{0}"*'.format(term) for term in terms)
+
+
+class SearchTextField(models.TextField):
+    """
+    Folded copy of the source fields of the model, updated whenever it is saved.
+
+    It is also filled by bulk_create, but not by update() or bulk_update(),
+    which must set it themselves.
+    """
+    def __init__(self, sources=(), **kwargs):
+        self.sources = tuple(sources)
+        super().__init__(**kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['sources'] = self.sources
+        return name, path, args, kwargs
+
+    def get_search_text(self, instance):
+        return fold(' '.join(str(getattr(instance, source) or '') for source in self.sources))
+
+    def pre_save(self, model_instance, add):
+        value = self.get_search_text(model_instance)
+        setattr(model_instance, self.attname, value)
+        return value
+
+def fts_table(model):
+    return '{0}_search'.format(model._meta.db_table)
+
+def create_fts_index(schema_editor, model, column):
+    """
+    Creates an SQLite FTS5 index of a column, kept in sync by triggers.
+
+    SQLite drops the triggers when a migration rebuilds the table, such
+    migrations must call this function again. Other databases search the
+    column directly.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    table = model._meta.db_table
+    fts = fts_table(model)
+    params = {'table': table, 'fts': fts, 'column': column}
+    drop_fts_index(schema_editor, model)
+    for statement in (
+        "CREATE VIRTUAL TABLE {fts} USING fts5({column}, content='{table}', content_rowid='id')",
+        "CREATE TRIGGER {fts}_insert AFTER INSERT ON {table} BEGIN "
+        "INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column}); END",
+        "CREATE TRIGGER {fts}_delete AFTER DELETE ON {table} BEGIN "
+        "INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column}); END",
+        "CREATE TRIGGER {fts}_update AFTER UPDATE OF {column} ON {table} BEGIN "
+        "INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column}); "
+        "INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column}); END",
+        "INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ):
+        schema_editor.execute(statement.format(**params))
+
+def drop_fts_index(schema_editor, model):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    fts = fts_table(model)
+    for trigger in ('insert', 'delete', 'update'):
+        schema_editor.execute('DROP TRIGGER IF EXISTS {0}_{1}'.format(fts, trigger))
+    schema_editor.execute('DROP TABLE IF EXISTS {0}'.format(fts))
+
+def search(queryset, field, text):
+    """
+    Filters the queryset to the rows whose search field has words starting with every term of the text.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return queryset
+    if connections[queryset.db].vendor == 'sqlite':
+        matches = RawSQL(
+            'SELECT rowid FROM {0} WHERE {0} MATCH %s'.format(fts_table(queryset.model)), (fts_match(terms),)
+        )
+        return queryset.filter(pk__in=matches)
+    for term in terms:
+        queryset = queryset.filter(**{field + '__contains': term})
+    return queryset
@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -27,6 +28,7 @@ INSTALLED_APPS = [
     'apps.affiliate',
     'apps.treasury',
     'apps.news',
+    'apps.benchmark',
 ]
 
 AUTHENTICATION_BACKENDS = [
@@ -39,13 +41,21 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.BasicAuthentication',
+        'CENDRA.authentication.CachedBasicAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'CENDRA.authentication.CachedTokenAuthentication',
     ]
 }
 
+# Authenticated tokens are kept in memory by each worker process. Changes made through
+# another process are only seen once the entry expires, so keep the timeout short.
+TOKEN_CACHE_SIZE = int(os.environ.get('DJANGO_TOKEN_CACHE_SIZE', 1024))
+TOKEN_CACHE_TIMEOUT = int(os.environ.get('DJANGO_TOKEN_CACHE_TIMEOUT', 30))
+BASIC_AUTH_CACHE_SIZE = int(os.environ.get('DJANGO_BASIC_AUTH_CACHE_SIZE', 1024))
+BASIC_AUTH_CACHE_TIMEOUT = int(os.environ.get('DJANGO_BASIC_AUTH_CACHE_TIMEOUT', 30))
+
 MIDDLEWARE = [
+    'CENDRA.metrics.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -53,9 +63,19 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'CENDRA.staticfiles.AsyncWhiteNoiseMiddleware',
 ]
 
+# Send the wall, database and serialization time of each request in a Server-Timing
+# header. Per-route histograms are exported by /api/private/metrics either way.
+SERVER_TIMING = os.environ.get('DJANGO_SERVER_TIMING', '') != 'False'
+
+# What to do when a request runs more queries than the query_budget of its view:
+# 'raise' QueryBudgetExceeded with the queries, 'log' them, or only 'record' the
+# violation, which the metrics count in every mode.
+TESTING = sys.argv[1:2] == ['test']
+QUERY_BUDGET_ACTION = os.environ.get('DJANGO_QUERY_BUDGET_ACTION', 'raise' if TESTING else 'log' if DEBUG else 'record')
+
 ROOT_URLCONF = 'CENDRA.urls' 
 
 TEMPLATES = [
@@ -75,6 +95,12 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'CENDRA.wsgi.application'
+ASGI_APPLICATION = 'CENDRA.asgi.application'
+
+# Threads running the independent queries of async views concurrently. With 0
+# they run one after another in the request thread. The ASGI mode of
+# gunicorn_config.py defaults it to 4.
+ASYNC_QUERY_WORKERS = int(os.environ.get('DJANGO_ASYNC_QUERY_WORKERS', 0))
 
 
 # Database
@@ -87,6 +113,26 @@ DATABASES = {
     }
 }
 
+# DJANGO_SQLITE_PROFILE=performance enables write-ahead logging, so readers don't block the
+# writer, persistent connections and immediate transactions for concurrent workers.
+# Compare both profiles on the target machine with 'manage.py benchmark_sqlite'.
+SQLITE_PERFORMANCE_PROFILE = {
+    'ENGINE': 'CENDRA.db.sqlite3',
+    'PRAGMAS': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'mmap_size': 268435456,
+        'cache_size': -65536,
+        'temp_store': 'MEMORY',
+    },
+    'TRANSACTION_MODE': 'IMMEDIATE',
+    'CONN_MAX_AGE': 600,
+    'CONN_HEALTH_CHECKS': True,
+}
+if os.environ.get('DJANGO_SQLITE_PROFILE') == 'performance':
+    DATABASES['default'].update(SQLITE_PERFORMANCE_PROFILE)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -107,6 +153,24 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing
+# https://docs.djangoproject.com/en/4.2/topics/auth/passwords/
+# DJANGO_PASSWORD_ITERATIONS sets the PBKDF2 work factor; run 'manage.py benchmark_hashers'
+# to measure it on the target machine. Existing hashes are upgraded on the next login.
+
+PASSWORD_ITERATIONS = os.environ.get('DJANGO_PASSWORD_ITERATIONS')
+if PASSWORD_ITERATIONS:
+    PASSWORD_ITERATIONS = int(PASSWORD_ITERATIONS)
+    PASSWORD_HASHERS = [
+        'CENDRA.hashers.TunedPBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+        'django.contrib.auth.hashers.Argon2PasswordHasher',
+        'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+        'django.contrib.auth.hashers.ScryptPasswordHasher',
+    ]
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.1/topics/i18n/
 
@@ -128,6 +192,22 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+# How uploaded files are sent: 'django' streams them from the workers, 'x-accel' (nginx)
+# and 'x-sendfile' (Apache, lighttpd) let the front proxy send them after the permission
+# check. With 'x-accel', MEDIA_ACCEL_PREFIX must be an internal location aliased to MEDIA_ROOT.
+MEDIA_SERVE_MODE = os.environ.get('DJANGO_MEDIA_SERVE_MODE', 'django')
+MEDIA_ACCEL_PREFIX = os.environ.get('DJANGO_MEDIA_ACCEL_PREFIX', '/protected-media/')
+MEDIA_CACHE_MAX_AGE = int(os.environ.get('DJANGO_MEDIA_CACHE_MAX_AGE', 3600))
+
+# Resized copies generated for uploaded photos and logos: name -> (width, height, crop)
+IMAGE_VARIANTS = {
+    'thumb': (128, 128, True),
+    'medium': (640, 640, False),
+}
+IMAGE_VARIANT_FORMAT = os.environ.get('DJANGO_IMAGE_VARIANT_FORMAT', 'WEBP')
+IMAGE_VARIANT_QUALITY = 80
+IMAGE_VARIANT_WORKERS = int(os.environ.get('DJANGO_IMAGE_VARIANT_WORKERS', 2))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
@@ -146,6 +226,36 @@ SWAGGER_SETTINGS = {
       }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# The local memory cache is private to each worker process: use the file or redis
+# backends (any Redis-compatible server) when running several workers, so writes
+# invalidate cached responses in all of them.
+
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+}
+CACHE_LOCATIONS = {
+    'locmem': 'cendra',
+    'file': os.path.join(BASE_DIR, 'cache'),
+    'redis': 'redis://127.0.0.1:6379',
+}
+CACHE_BACKEND = os.environ.get('DJANGO_CACHE_BACKEND', 'locmem')
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', CACHE_LOCATIONS[CACHE_BACKEND]),
+        'KEY_PREFIX': 'cendra',
+    }
+}
+
+# Seconds cached responses are kept; writes to the entity data invalidate them earlier
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('DJANGO_RESPONSE_CACHE_TIMEOUT', 300))
+DASHBOARD_CACHE_TIMEOUT = int(os.environ.get('DJANGO_DASHBOARD_CACHE_TIMEOUT', 60))
+
 DATE_INPUT_FORMATS = ['%d-%m-%Y']
 #SECURE_SSL_REDIRECT = True
 SESSION_COOKIE_SECURE = True
@@ -1,14 +1,15 @@
 """CENDRA URL Configuration"""
 import os
+import re
 from django.contrib import admin
 from django.conf import settings
-from django.conf.urls.static import static
 from django.urls import path, include, re_path
 from rest_framework.authtoken import views
 from rest_framework import permissions
 from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
 from drf_yasg.generators import OpenAPISchemaGenerator
+from CENDRA.media import MediaFile
 
 class PrivateSchemaGenerator(OpenAPISchemaGenerator):
     def get_schema(self, request=None, public=False):
@@ -33,4 +34,5 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/public/', include('apps.api.urls_public')),
     path('api/private/', include('apps.api.urls_private')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    re_path(r'^{0}(?P<path>.*)$'.format(re.escape(settings.MEDIA_URL.lstrip('/'))), MediaFile.as_view()),
+]
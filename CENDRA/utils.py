@@ -1,11 +1,126 @@
+from django.core.exceptions import FieldDoesNotExist
+from drf_yasg import openapi
 from rest_framework import serializers
+from rest_framework.exceptions import ParseError
+from CENDRA.images import variant_url
+
+class DynamicFieldsMixin:
+    """
+    Serializer whose fields can be narrowed with the 'fields' kwarg and
+    completed with the 'expandable_fields' named in the 'expand' kwarg.
+    """
+    # Relations serialized as their primary key unless expanded: name -> (serializer class, kwargs)
+    expandable_fields = {}
 
-class DynamicFieldsSerializer(serializers.ModelSerializer):
     def __init__(self, *args, **kwargs):
         fields = kwargs.pop('fields', None)
+        expand = kwargs.pop('expand', ())
         super().__init__(*args, **kwargs)
+        for field_name in expand:
+            serializer_class, serializer_kwargs = self.expandable_fields[field_name]
+            self.fields[field_name] = serializer_class(read_only=True, **serializer_kwargs)
         if fields is not None:
-            allowed = set(fields)
+            allowed = set(fields) | set(expand)
             existing = set(self.fields)
             for field_name in existing - allowed:
-                self.fields.pop(field_name)
\ No newline at end of file
+                self.fields.pop(field_name)
+
+class DynamicFieldsSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    # Model paths or annotations read by the serializer fields whose source is not a model field, e.g. properties
+    field_sources = {}
+
+    @classmethod
+    def restrict_queryset(cls, queryset, fields=None, expand=(), extra=()):
+        """
+        Loads only the columns read by the selected fields, and the 'extra' ones.
+
+        Relations are joined with select_related only when a selected field, or
+        an expanded or nested serializer, reads them. If a field reads something
+        the serializer can't tell, every column is loaded.
+        """
+        only, related = set(extra), set()
+        restrictable = collect_field_paths(cls(fields=fields, expand=expand), '', only, related)
+        if related:
+            queryset = queryset.select_related(*sorted(related))
+        if restrictable:
+            queryset = queryset.only(*sorted(only))
+        return queryset
+
+def collect_field_paths(serializer, prefix, only, related):
+    """
+    Adds to 'only' the model paths read by the serializer, and to 'related' the relations to join.
+
+    Returns False if a field reads something other than model fields or declared annotations.
+    """
+    restrictable = True
+    model = serializer.Meta.model
+    field_sources = getattr(serializer, 'field_sources', {})
+    for name, field in serializer.fields.items():
+        if name in field_sources:
+            paths = field_sources[name]
+        elif isinstance(field, serializers.ModelSerializer):
+            related.add(prefix + field.source)
+            restrictable &= collect_field_paths(field, prefix + field.source + '__', only, related)
+            continue
+        else:
+            paths = (field.source,)
+        for path in paths:
+            if not is_model_path(model, path):
+                # Annotations are always selected, only() doesn't take them
+                restrictable &= name in field_sources
+                continue
+            only.add(prefix + path)
+            if '__' in path:
+                related.add(prefix + path.rsplit('__', 1)[0])
+    return restrictable
+
+def is_model_path(model, path):
+    for name in path.split('__'):
+        if model is None:
+            return False
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return False
+        if field.many_to_many or field.one_to_many:
+            return False
+        model = field.related_model
+    return True
+
+SPARSE_FIELDSET_PARAMETERS = [
+    openapi.Parameter('fields', openapi.IN_QUERY, description="Comma separated fields to return, all by default", type=openapi.TYPE_STRING, required=False),
+    openapi.Parameter('expand', openapi.IN_QUERY, description="Comma separated relations to return as objects instead of IDs", type=openapi.TYPE_STRING, required=False),
+]
+
+def get_sparse_fieldset(request, serializer_class, allowed=None):
+    """
+    Returns the serializer kwargs selected by the 'fields' and 'expand' query params.
+
+    Both are comma separated field names. Without 'fields', every field, or
+    every 'allowed' field if given, is returned.
+    """
+    serializer = serializer_class()
+    fields = request.query_params.get('fields')
+    expand = request.query_params.get('expand')
+    fields = [name for name in fields.split(',') if name] if fields else allowed
+    expand = [name for name in expand.split(',') if name] if expand else []
+    unknown = set(fields or ()) - set(allowed or serializer.fields) - set(expand)
+    unknown |= set(expand) - set(getattr(serializer, 'expandable_fields', {}))
+    if unknown:
+        raise ParseError('Unknown fields: {0}'.format(', '.join(sorted(unknown))))
+    return {'fields': fields, 'expand': expand}
+
+class ImageVariantField(serializers.ReadOnlyField):
+    """
+    URL of a resized variant of an image field, as listed in IMAGE_VARIANTS.
+    """
+    def __init__(self, variant, **kwargs):
+        self.variant = variant
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        url = variant_url(value, self.variant)
+        request = self.context.get('request', None)
+        if url is not None and request is not None:
+            return request.build_absolute_uri(url)
+        return url
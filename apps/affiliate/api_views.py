@@ -1,6 +1,5 @@
-from io import BytesIO
 import datetime
-from django.http import HttpResponse
+import tempfile
 import xlsxwriter
 from django.shortcuts import get_object_or_404
 from rest_framework import status
@@ -9,10 +8,32 @@ from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
+from CENDRA.async_views import AsyncAPIView, file_attachment_response, run_blocking
+from CENDRA.cache import conditional_response
+from CENDRA.compiled_serializers import serialize_list
+from CENDRA.pagination import KeysetPagination
+from CENDRA.utils import SPARSE_FIELDSET_PARAMETERS, get_sparse_fieldset
+from .batch import AffiliateBatch, InvalidUpdates
+from .imports import AffiliateImporter, read_rows
 from .models import Affiliate, PaymentChoice
 from .serializers import AffiliateSerializer, PaymentChoiceSerializer
 
 class Affiliates(APIView):
+    # A page is 2 queries, creating an affiliate with a photo 5
+    query_budget = 5
+    # Orderings of the 'sort' query param, unique thanks to the primary key
+    orderings = {
+        'census_number': ('census_number', 'pk'),
+        '-census_number': ('-census_number', '-pk'),
+        'surnames': ('surnames', 'name', 'pk'),
+        '-surnames': ('-surnames', '-name', '-pk'),
+        'name': ('name', 'surnames', 'pk'),
+        '-name': ('-name', '-surnames', '-pk'),
+        'birthday': ('birthday', 'pk'),
+        '-birthday': ('-birthday', '-pk'),
+    }
+    booleans = {'true': True, 'false': False}
+
     @swagger_auto_schema(
             manual_parameters=[
                 openapi.Parameter(
@@ -20,31 +41,60 @@ class Affiliates(APIView):
                     openapi.IN_QUERY, 
                     description="Affiliate ID to retrieve", 
                     type=openapi.TYPE_INTEGER, required=False
-                )
-            ],
+                ),
+                openapi.Parameter('search', openapi.IN_QUERY, description="Words starting the name, surnames, document or city, ignoring case and accents", type=openapi.TYPE_STRING, required=False),
+                openapi.Parameter('active', openapi.IN_QUERY, description="Only active (true) or inactive (false) affiliates", type=openapi.TYPE_BOOLEAN, required=False),
+                openapi.Parameter('city', openapi.IN_QUERY, description="City of the affiliates", type=openapi.TYPE_STRING, required=False),
+                openapi.Parameter('document_id', openapi.IN_QUERY, description="Document of the affiliate", type=openapi.TYPE_STRING, required=False),
+                openapi.Parameter('sort', openapi.IN_QUERY, description="Sort order", type=openapi.TYPE_STRING, enum=list(orderings), required=False),
+                openapi.Parameter('cursor', openapi.IN_QUERY, description="Cursor returned as 'next' by the previous page", type=openapi.TYPE_STRING, required=False),
+                openapi.Parameter('page_size', openapi.IN_QUERY, description="Number of affiliates per page", type=openapi.TYPE_INTEGER, required=False)
+            ] + SPARSE_FIELDSET_PARAMETERS[:1],
             responses={
                 200: openapi.Response("Successful request.", AffiliateSerializer),
                 400: openapi.Response("Bad request."),
             }
     )
+    @conditional_response(lambda request: Affiliate.objects.filter(entity=request.user.entity_id))
     def get(self, request, *args, **kwargs):
         """
-        Returns an array of affiliates of the current user entity.
+        Returns a page of affiliates of the current user entity.
 
+        Affiliates are ordered by census number, or as requested by the query
+        param 'sort', and paginated by cursor: the response holds the page
+        'results' and the 'next' page URL, if any. They can be filtered with
+        the query params 'search', 'active', 'city' and 'document_id', and
+        narrowed to the fields listed by the query param 'fields'.
         If query param 'id' is provided, returns only one object.
         """
+        affiliates = Affiliate.objects.filter(entity=request.user.entity.id)
         affiliate_id = self.request.query_params.get('id')
         if affiliate_id:
             try:
                 int(affiliate_id)
-                affiliates = get_object_or_404(Affiliate, pk=affiliate_id, entity=request.user.entity)
-                serializer = AffiliateSerializer(affiliates, many=False)
+                affiliate = get_object_or_404(affiliates.select_related('payment_choice').with_position(), pk=affiliate_id)
+                serializer = AffiliateSerializer(affiliate, many=False)
             except ValueError:
                 return Response(status=status.HTTP_400_BAD_REQUEST)
-        else:
-            affiliates = Affiliate.objects.filter(entity=request.user.entity.id)
-            serializer = AffiliateSerializer(affiliates, many=True)
-        return Response(serializer.data)
+            return Response(serializer.data)
+        params = self.request.query_params
+        ordering = self.orderings.get(params.get('sort', 'census_number'))
+        if ordering is None or params.get('active', 'true') not in self.booleans:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        sparse = get_sparse_fieldset(request, AffiliateSerializer)
+        if sparse['fields'] is None or 'position' in sparse['fields']:
+            affiliates = affiliates.with_position()
+        if 'active' in params:
+            affiliates = affiliates.filter(active=self.booleans[params['active']])
+        if params.get('city'):
+            affiliates = affiliates.filter(city__iexact=params['city'])
+        if params.get('document_id'):
+            affiliates = affiliates.filter(document_id__iexact=params['document_id'])
+        if params.get('search'):
+            affiliates = affiliates.search(params['search'])
+        paginator = KeysetPagination(ordering=ordering)
+        data = serialize_list(AffiliateSerializer, affiliates, paginator=paginator, request=request, **sparse)
+        return paginator.get_paginated_response(data)
 
     @swagger_auto_schema(request_body=AffiliateSerializer)
     def post(self, request, *args, **kwargs):
@@ -86,6 +136,7 @@ class Affiliates(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
 class PaymentChoices(APIView):
+    query_budget = 8
     @swagger_auto_schema(
             manual_parameters=[
                 openapi.Parameter('affiliate', openapi.IN_QUERY, description="Affiliate ID to retrieve", type=openapi.TYPE_INTEGER, required=False)
@@ -174,6 +225,7 @@ class PaymentChoices(APIView):
         return Response(status=status.HTTP_400_BAD_REQUEST)
     
 class UpdatePhoto(APIView):
+    query_budget = 8
     parser_classes = (MultiPartParser, FormParser)
     @swagger_auto_schema()
     def post(self, request, *args, **kwargs):
@@ -192,72 +244,168 @@ class UpdatePhoto(APIView):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(status=status.HTTP_400_BAD_REQUEST)
         
-class ExportAffiliates(APIView):
+class ExportAffiliates(AsyncAPIView):
+    query_budget = 4
+    header = ('COD.JCF', 'NUM.CENSO', 'SU.REF.', 'INF/MAY', 'APELLIDOS', 'NOMBRE', 'DIRECCION', 'POBLACION',
+              'C.POSTAL', 'TELEF1', 'TELEF2', 'F.NAC.', 'SEXO', 'DNI', 'CARGO', 'RECOMPENSA')
+    chunk_size = 2000
+
     @swagger_auto_schema(responses={
                 200: openapi.Response("Successful request."),
                 401: openapi.Response("User is not entity admin."),
             })
-    def get(self, request, *args, **kwargs):
+    async def get(self, request, *args, **kwargs):
         """ 
         Generates an excel report of affiliates of the current user entity.
 
         """
         if(request.user.is_entity_admin):
-            output = BytesIO()
-            workbook = xlsxwriter.Workbook(output)
-            header = workbook.add_format({'bold': True})
-            worksheet = workbook.add_worksheet()
-            worksheet.write(0, 0, 'COD.JCF', header)
-            worksheet.write(0, 1, 'NUM.CENSO', header)
-            worksheet.write(0, 2, 'SU.REF.', header)
-            worksheet.write(0, 3, 'INF/MAY', header)
-            worksheet.write(0, 4, 'APELLIDOS', header)
-            worksheet.write(0, 5, 'NOMBRE', header)
-            worksheet.write(0, 6, 'DIRECCION', header)
-            worksheet.write(0, 7, 'POBLACION', header)
-            worksheet.write(0, 8, 'C.POSTAL', header)
-            worksheet.write(0, 9, 'TELEF1', header)
-            worksheet.write(0, 10, 'TELEF2', header)
-            worksheet.write(0, 11, 'F.NAC.', header)
-            worksheet.write(0, 12, 'SEXO', header)
-            worksheet.write(0, 13, 'DNI', header)
-            worksheet.write(0, 14, 'CARGO', header)
-            worksheet.write(0, 15, 'RECOMPENSA', header)
-            affiliates = Affiliate.objects.filter(entity=request.user.entity.id, active=True)
-            i = 1
-            for affiliate in affiliates:
-                worksheet.write(i, 0, affiliate.jcf_number)
-                worksheet.write(i, 1, affiliate.census_number)
-                worksheet.write(i, 2, "")
-                # Calculate affiliate years in next march
-                current = datetime.datetime.now()
-                year = current.year
-                if(current.month > 3):
-                    year += 1
-                if year < 16:
-                    worksheet.write(i, 3, "INF")
-                else:
-                    worksheet.write(i, 3, "MAY")
-                worksheet.write(i, 4, affiliate.surnames.upper)
-                worksheet.write(i, 5, affiliate.name.upper)
-                worksheet.write(i, 6, affiliate.address.upper)
-                worksheet.write(i, 7, affiliate.city.upper)
-                worksheet.write(i, 8, affiliate.postal_code)
-                worksheet.write(i, 9, affiliate.phone)
-                worksheet.write(i, 10, "")
-                worksheet.write(i, 11, str(affiliate.birthday))
-                # Fill the gender according to JCF nomenclature. Male = H; Female = M
-                gender = "H"
-                if(affiliate.gender == "F"):
-                    gender = "M"
-                worksheet.write(i, 12, gender.upper)
-                worksheet.write(i, 13, affiliate.document_id.upper)
-                worksheet.write(i, 14, affiliate.position.upper)
-                worksheet.write(i, 15, "")
-                i += 1
-            workbook.close()
-            response = HttpResponse(content_type='application/vnd.ms-excel')
-            response['Content-Disposition'] = 'attachment;filename="Censo_'+str(year)+'.xlsx"'
-            response.write(output.getvalue())
-            return response
-        return Response(status=status.HTTP_401_UNAUTHORIZED)
\ No newline at end of file
+            # Calculate affiliate years in next march
+            current = datetime.datetime.now()
+            year = current.year
+            if(current.month > 3):
+                year += 1
+            # The workbook is written off the event loop, which keeps serving other requests
+            output = await run_blocking(self.write_workbook, request.user.entity_id, datetime.date(year, 3, 1))
+            return file_attachment_response(request, output, 'Censo_'+str(year)+'.xlsx', 'application/vnd.ms-excel')
+        return Response(status=status.HTTP_401_UNAUTHORIZED)
+
+    def write_workbook(self, entity_id, next_march):
+        """
+        Writes the census of active affiliates to a temporary file.
+        """
+        # Rows are flushed to disk as they are written, so memory stays flat whatever the roster size
+        output = tempfile.TemporaryFile()
+        workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+        header = workbook.add_format({'bold': True})
+        worksheet = workbook.add_worksheet()
+        worksheet.write_row(0, 0, self.header, header)
+        affiliates = Affiliate.objects.filter(entity=entity_id, active=True).with_position().only(
+            'jcf_number', 'census_number', 'surnames', 'name', 'address', 'city', 'postal_code',
+            'phone', 'birthday', 'gender', 'document_id'
+        )
+        for i, affiliate in enumerate(affiliates.iterator(chunk_size=self.chunk_size), start=1):
+            birthday = affiliate.birthday
+            age = next_march.year - birthday.year - ((next_march.month, next_march.day) < (birthday.month, birthday.day))
+            # Fill the gender according to JCF nomenclature. Male = H; Female = M
+            gender = "H"
+            if(affiliate.gender == "F"):
+                gender = "M"
+            worksheet.write_row(i, 0, (
+                affiliate.jcf_number,
+                affiliate.census_number,
+                "",
+                "INF" if age < 16 else "MAY",
+                affiliate.surnames.upper(),
+                affiliate.name.upper(),
+                affiliate.address.upper(),
+                affiliate.city.upper(),
+                affiliate.postal_code,
+                affiliate.phone,
+                "",
+                str(birthday),
+                gender,
+                affiliate.document_id.upper(),
+                affiliate.position.upper(),
+                "",
+            ))
+        workbook.close()
+        output.seek(0)
+        return output
+
+class ImportAffiliates(APIView):
+    # Rows are inserted in batches, so the queries grow with the file
+    query_budget = None
+    parser_classes = (MultiPartParser, FormParser)
+
+    @swagger_auto_schema(
+            manual_parameters=[
+                openapi.Parameter('file', openapi.IN_FORM, description="CSV or XLSX file, with a header row naming the affiliate fields", type=openapi.TYPE_FILE, required=True)
+            ],
+            responses={
+                200: openapi.Response("Number of affiliates created and errors of the invalid rows."),
+                400: openapi.Response("Bad request."),
+                401: openapi.Response("User is not entity admin."),
+            }
+    )
+    def post(self, request, *args, **kwargs):
+        """
+        Creates the affiliates listed in a CSV or XLSX file for the current user entity.
+
+        The header row names the columns as the affiliate fields, plus
+        payment_type, account_holder and account_iban for the payment choice.
+        Valid rows are imported even if others are not. Returns the number of
+        affiliates 'created' and the 'errors' of each invalid row.
+        """
+        if not request.user.is_entity_admin:
+            return Response(status=status.HTTP_401_UNAUTHORIZED)
+        upload = request.data.get('file')
+        if upload is None:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        try:
+            header, rows = read_rows(upload, upload.name)
+            report = AffiliateImporter(request.user.entity).run(header, rows)
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report)
+
+class AffiliatesBatch(APIView):
+    # bulk_update runs a query per 500 affiliates
+    query_budget = None
+
+    @swagger_auto_schema(
+            request_body=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'operation': openapi.Schema(type=openapi.TYPE_STRING, enum=['update', 'renumber_census', 'deactivate_without_payment_choice']),
+                    'updates': openapi.Schema(
+                        type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_OBJECT),
+                        description="With 'update': the 'id' of each affiliate and the fields to change"
+                    ),
+                    'sort': openapi.Schema(
+                        type=openapi.TYPE_STRING, enum=list(Affiliates.orderings),
+                        description="With 'renumber_census': the order of the new numbers, 'surnames' by default"
+                    ),
+                },
+                required=['operation']
+            ),
+            responses={
+                200: openapi.Response("Number of affiliates updated."),
+                400: openapi.Response("Bad request, with the errors of each invalid update."),
+                401: openapi.Response("User is not entity admin."),
+            }
+    )
+    def post(self, request, *args, **kwargs):
+        """
+        Changes many affiliates of the current user entity in a single transaction.
+
+        The 'operation' is one of:
+        - 'update': applies the partial 'updates', all of them or none.
+        - 'renumber_census': numbers the census of the active affiliates from 1, in the 'sort' order,
+          and then the inactive ones.
+        - 'deactivate_without_payment_choice': deactivates the affiliates with no payment choice.
+
+        Returns the operation and the number of affiliates 'updated'.
+        """
+        if not request.user.is_entity_admin:
+            return Response(status=status.HTTP_401_UNAUTHORIZED)
+        operation = request.data.get('operation')
+        batch = AffiliateBatch(request.user.entity)
+        if operation == 'update':
+            updates = request.data.get('updates')
+            if not isinstance(updates, list):
+                return Response(status=status.HTTP_400_BAD_REQUEST)
+            try:
+                updated = batch.update(updates)
+            except InvalidUpdates as exc:
+                return Response({'errors': exc.errors}, status=status.HTTP_400_BAD_REQUEST)
+        elif operation == 'renumber_census':
+            ordering = Affiliates.orderings.get(request.data.get('sort', 'surnames'))
+            if ordering is None:
+                return Response(status=status.HTTP_400_BAD_REQUEST)
+            updated = batch.renumber_census(ordering)
+        elif operation == 'deactivate_without_payment_choice':
+            updated = batch.deactivate_without_payment_choice()
+        else:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        return Response({'operation': operation, 'updated': updated})
@@ -0,0 +1,129 @@
+from django.db import connection, transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.fields import empty
+from CENDRA.authentication import discard_users
+from CENDRA.cache import bump_cache_version, entity_scope
+from .imports import AFFILIATE_COLUMNS
+from .models import SEARCH_FIELDS, Affiliate
+from .serializers import AffiliateSerializer
+
+# Fields a batch update can change, the same ones an import file can fill
+UPDATABLE_FIELDS = AFFILIATE_COLUMNS
+
+
+class InvalidUpdates(Exception):
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+class AffiliateBatch:
+    """
+    Changes many affiliates of an entity at once, each operation in a single
+    transaction, and returns how many affiliates were changed.
+
+    Set-based operations run as a single UPDATE, lists of partial updates as a
+    bulk_update. Neither sends post_save signals, so the caches are
+    invalidated here.
+    """
+    def __init__(self, entity, batch_size=500):
+        self.entity = entity
+        self.batch_size = batch_size
+        self.affiliates = Affiliate.objects.filter(entity=entity)
+
+    def update(self, updates):
+        """
+        Applies partial updates, each one a dict with the 'id' of an affiliate and the fields to change.
+
+        Raises InvalidUpdates with the errors of each invalid update, by its
+        index in the list. Nothing is changed then. Fields other than
+        UPDATABLE_FIELDS are errors too, so a misspelt field can't pass for an
+        update.
+        """
+        serializer = AffiliateSerializer(fields=UPDATABLE_FIELDS, partial=True)
+        id_field = serializers.IntegerField()
+        changes, errors = [], []
+        for index, update in enumerate(updates):
+            data = dict(update) if isinstance(update, dict) else {}
+            try:
+                affiliate_id = id_field.run_validation(data.pop('id', empty))
+            except serializers.ValidationError as exc:
+                errors.append({'index': index, 'errors': {'id': exc.detail}})
+                continue
+            unknown = {name: ['This field cannot be updated.'] for name in sorted(set(data) - set(UPDATABLE_FIELDS))}
+            try:
+                validated_data = serializer.run_validation(data)
+            except serializers.ValidationError as exc:
+                errors.append({'index': index, 'errors': {**exc.detail, **unknown}})
+                continue
+            if unknown:
+                errors.append({'index': index, 'errors': unknown})
+                continue
+            changes.append((index, affiliate_id, validated_data))
+        instances = self.affiliates.in_bulk([affiliate_id for _, affiliate_id, _ in changes])
+        for index, affiliate_id, _ in changes:
+            if affiliate_id not in instances:
+                errors.append({'index': index, 'errors': {'id': ['Affiliate not found.']}})
+        if errors:
+            raise InvalidUpdates(sorted(errors, key=lambda error: error['index']))
+
+        fields = {'updated_at'}
+        now = timezone.now()
+        for _, affiliate_id, validated_data in changes:
+            affiliate = instances[affiliate_id]
+            for name, value in validated_data.items():
+                setattr(affiliate, name, value)
+            affiliate.updated_at = now
+            fields.update(validated_data)
+        if fields & set(SEARCH_FIELDS):
+            # bulk_update skips pre_save, which refreshes the search text
+            search_text = Affiliate._meta.get_field('search_text')
+            for affiliate in instances.values():
+                affiliate.search_text = search_text.get_search_text(affiliate)
+            fields.add('search_text')
+        with transaction.atomic():
+            Affiliate.objects.bulk_update(instances.values(), sorted(fields), batch_size=self.batch_size)
+        self.invalidate_caches()
+        return len(instances)
+
+    def renumber_census(self, ordering):
+        """
+        Numbers the active affiliates from 1 in the given order, with a single UPDATE.
+
+        Affiliates without a census number go last. Inactive affiliates are
+        numbered after the active ones, in the same order, so no two
+        affiliates share a number. Runs on SQLite 3.33 or later and
+        PostgreSQL, which support UPDATE ... FROM.
+        """
+        order_by = [F('active').desc()] + [
+            F(field[1:]).desc(nulls_last=True) if field.startswith('-') else F(field).asc(nulls_last=True)
+            for field in ordering
+        ]
+        ranked = self.affiliates.annotate(number=Window(RowNumber(), order_by=order_by)).order_by().values('id', 'number')
+        sql, params = ranked.query.sql_with_params()
+        quote = connection.ops.quote_name
+        table = quote(Affiliate._meta.db_table)
+        update = 'UPDATE {0} SET {1} = ranked.number, {2} = %s FROM ({3}) AS ranked WHERE {0}.{4} = ranked.{4}'.format(
+            table, quote('census_number'), quote('updated_at'), sql, quote('id')
+        )
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(update, (connection.ops.adapt_datetimefield_value(timezone.now()),) + tuple(params))
+            updated = cursor.rowcount
+        self.invalidate_caches()
+        return updated
+
+    def deactivate_without_payment_choice(self):
+        """
+        Deactivates the active affiliates with no payment choice, with a single UPDATE.
+        """
+        with transaction.atomic():
+            updated = self.affiliates.filter(active=True, payment_choice__isnull=True).update(active=False, updated_at=timezone.now())
+        self.invalidate_caches()
+        return updated
+
+    def invalidate_caches(self):
+        bump_cache_version(entity_scope(self.entity.pk))
+        # Authenticated users are cached with their affiliate
+        discard_users(lambda user: user.entity_id == self.entity.pk)
@@ -0,0 +1,139 @@
+import csv
+import datetime
+import io
+import os
+import zipfile
+from django.db import transaction
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+from rest_framework import serializers
+from CENDRA.cache import bump_cache_version, entity_scope
+from .models import Affiliate, PaymentChoice
+from .serializers import AffiliateSerializer
+
+# Columns of an import file, named as the AffiliateSerializer fields
+AFFILIATE_COLUMNS = (
+    'census_number', 'jcf_number', 'name', 'surnames', 'document_type', 'document_id', 'email', 'phone',
+    'birthday', 'gender', 'address', 'postal_code', 'city', 'province', 'country', 'active',
+)
+PAYMENT_CHOICE_COLUMNS = ('payment_type', 'account_holder', 'account_iban')
+
+def read_csv(file):
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    sample = text.read(4096)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(text, dialect)
+    return next(reader, []), reader
+
+def read_xlsx(file):
+    try:
+        workbook = load_workbook(file, read_only=True, data_only=True)
+    except (InvalidFileException, zipfile.BadZipFile, KeyError) as exc:
+        raise ValueError('Invalid XLSX file') from exc
+    rows = workbook.active.iter_rows(values_only=True)
+    header = next(rows, ())
+    def remaining_rows():
+        # Read-only workbooks keep the file open until closed
+        try:
+            yield from rows
+        finally:
+            workbook.close()
+    return header, remaining_rows()
+
+READERS = {'.csv': read_csv, '.xlsx': read_xlsx}
+
+def read_rows(file, filename):
+    """
+    Returns the column names of a CSV or XLSX file, and an iterator over its rows.
+
+    The file is read as the rows are iterated, never loaded at once. Raises
+    ValueError if the file type is not supported.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in READERS:
+        raise ValueError('Unsupported file type, upload a CSV or XLSX file')
+    header, rows = READERS[extension](file)
+    return [str(name or '').strip().lower() for name in header], rows
+
+def clean_value(value):
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, datetime.datetime) and value.time() == datetime.time():
+        # Spreadsheets store dates as midnight datetimes
+        return value.date()
+    return value
+
+
+class AffiliateImporter:
+    """
+    Creates affiliates of an entity, and their payment choices, from the rows of an import file.
+
+    Rows are validated with the AffiliateSerializer rules. The valid ones are
+    inserted with bulk_create in batches, each in its own transaction, so an
+    error halfway through keeps the batches already imported.
+    """
+    def __init__(self, entity, batch_size=500):
+        self.entity = entity
+        self.batch_size = batch_size
+        self.serializer = AffiliateSerializer(fields=AFFILIATE_COLUMNS + ('payment_choice',))
+        # Choices can also be written as their label, e.g. 'DNI' or 'Mujer'
+        self.choice_labels = {
+            name: {str(label).lower(): value for value, label in field.choices.items()}
+            for name, field in list(self.serializer.fields.items()) + list(self.serializer.fields['payment_choice'].fields.items())
+            if isinstance(field, serializers.ChoiceField)
+        }
+
+    def get_data(self, header, row):
+        data = {}
+        for name, value in zip(header, row):
+            value = clean_value(value)
+            if value is None or value == '':
+                continue
+            if isinstance(value, str) and value.lower() in self.choice_labels.get(name, {}):
+                value = self.choice_labels[name][value.lower()]
+            data[name] = value
+        payment_choice = {name: data.pop(name) for name in PAYMENT_CHOICE_COLUMNS if name in data}
+        if payment_choice:
+            data['payment_choice'] = payment_choice
+        return data
+
+    def run(self, header, rows):
+        """
+        Imports the rows, returns the number of affiliates created and the errors of the invalid rows.
+
+        Rows are numbered as in the file, the header being row 1.
+        """
+        report = {'created': 0, 'errors': [], 'ignored_columns': sorted(set(header) - set(AFFILIATE_COLUMNS + PAYMENT_CHOICE_COLUMNS) - {''})}
+        batch = []
+        for number, row in enumerate(rows, start=2):
+            data = self.get_data(header, row)
+            if not data:
+                continue
+            try:
+                batch.append(self.serializer.run_validation(data))
+            except serializers.ValidationError as exc:
+                report['errors'].append({'row': number, 'errors': exc.detail})
+            if len(batch) >= self.batch_size:
+                report['created'] += self.insert(batch)
+                batch = []
+        if batch:
+            report['created'] += self.insert(batch)
+        return report
+
+    def insert(self, batch):
+        payment_choices = [data.pop('payment_choice', None) for data in batch]
+        affiliates = [Affiliate(entity=self.entity, **data) for data in batch]
+        with transaction.atomic():
+            # bulk_create fills the search text, and the primary keys the payment choices need
+            Affiliate.objects.bulk_create(affiliates)
+            PaymentChoice.objects.bulk_create(
+                PaymentChoice(affiliate=affiliate, **payment_choice)
+                for affiliate, payment_choice in zip(affiliates, payment_choices) if payment_choice is not None
+            )
+        # bulk_create sends no post_save signals
+        bump_cache_version(entity_scope(self.entity.pk))
+        return len(affiliates)
@@ -0,0 +1,33 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from apps.affiliate.imports import AffiliateImporter, read_rows
+from apps.entity.models import Entity
+
+
+class Command(BaseCommand):
+    help = 'Creates the affiliates of an entity listed in a CSV or XLSX file, reporting the invalid rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('entity', type=int, help='ID of the entity of the affiliates.')
+        parser.add_argument('file', help='CSV or XLSX file, with a header row naming the affiliate fields.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows inserted per transaction.')
+
+    def handle(self, *args, **options):
+        entity = Entity.objects.filter(pk=options['entity']).first()
+        if entity is None:
+            raise CommandError('Entity {0} does not exist.'.format(options['entity']))
+        start = time.perf_counter()
+        try:
+            with open(options['file'], 'rb') as file:
+                header, rows = read_rows(file, options['file'])
+                report = AffiliateImporter(entity, options['batch_size']).run(header, rows)
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+        if report['ignored_columns']:
+            self.stdout.write(self.style.WARNING('Ignored columns: {0}'.format(', '.join(report['ignored_columns']))))
+        for error in report['errors']:
+            self.stdout.write('Row {0}: {1}'.format(error['row'], error['errors']))
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS('{0} affiliates imported in {1:.1f}s, {2} invalid rows.'.format(
+            report['created'], elapsed, len(report['errors'])
+        )))
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.2 on 2026-10-18 15:20
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('affiliate', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='affiliate',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.2 on 2026-10-18 15:03
+
+import CENDRA.images
+import apps.affiliate.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('affiliate', '0003_affiliate_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='affiliate',
+            name='photo',
+            field=CENDRA.images.VariantImageField(default='/default_photo.png', upload_to=apps.affiliate.models.Affiliate.photo_upload_rename),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.2 on 2026-10-18 15:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('affiliate', '0004_affiliate_photo_variants'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='affiliate',
+            index=models.Index(fields=['entity', 'census_number', 'id'], name='affiliate_entity_census'),
+        ),
+        migrations.AddIndex(
+            model_name='affiliate',
+            index=models.Index(fields=['entity', 'active', 'census_number', 'id'], name='affiliate_entity_active'),
+        ),
+    ]
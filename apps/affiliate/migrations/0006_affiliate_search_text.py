@@ -0,0 +1,36 @@
+# Generated by Django 4.2.2 on 2026-10-18 16:02
+
+import CENDRA.search
+from django.db import migrations
+
+
+def fill_search_text(apps, schema_editor):
+    Affiliate = apps.get_model('affiliate', 'Affiliate')
+    field = Affiliate._meta.get_field('search_text')
+    affiliates = list(Affiliate.objects.only('name', 'surnames', 'document_id', 'city'))
+    for affiliate in affiliates:
+        affiliate.search_text = field.get_search_text(affiliate)
+    Affiliate.objects.bulk_update(affiliates, ['search_text'], batch_size=1000)
+
+def create_search_index(apps, schema_editor):
+    CENDRA.search.create_fts_index(schema_editor, apps.get_model('affiliate', 'Affiliate'), 'search_text')
+
+def drop_search_index(apps, schema_editor):
+    CENDRA.search.drop_fts_index(schema_editor, apps.get_model('affiliate', 'Affiliate'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('affiliate', '0005_affiliate_entity_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='affiliate',
+            name='search_text',
+            field=CENDRA.search.SearchTextField(default='', editable=False, sources=('name', 'surnames', 'document_id', 'city')),
+        ),
+        migrations.RunPython(fill_search_text, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -2,8 +2,29 @@ import re
 import os
 from django.db import models
 from django.core.exceptions import ValidationError
+from django.db.models.functions import Coalesce
+from CENDRA.images import VariantImageField
+from CENDRA.search import SearchTextField, search
 from apps.entity.models import Directorate
 
+DEFAULT_POSITION = 'Vocal'
+SEARCH_FIELDS = ('name', 'surnames', 'document_id', 'city')
+
+class AffiliateQuerySet(models.QuerySet):
+    def with_position(self):
+        """
+        Annotates the name of the directorate position of each affiliate.
+        """
+        return self.annotate(position_name=Coalesce('directorate__position__name', models.Value(DEFAULT_POSITION)))
+
+    def search(self, text):
+        """
+        Filters the affiliates whose name, surnames, document or city have words starting with every term of the text.
+
+        Case and accents are ignored.
+        """
+        return search(self, 'search_text', text)
+
 class Affiliate(models.Model):
     def photo_upload_rename(instance, filename):
         _, ext = os.path.splitext(filename)
@@ -27,7 +48,7 @@ class Affiliate(models.Model):
     document_id = models.CharField(max_length=9)
     email = models.EmailField(blank=True)
     phone = models.CharField(max_length=9, blank=True)
-    photo = models.ImageField(default="/default_photo.png", upload_to=photo_upload_rename)
+    photo = VariantImageField(default="/default_photo.png", upload_to=photo_upload_rename)
     birthday = models.DateField()
     gender = models.CharField(max_length=9, choices=Gender.choices, default=Gender.MALE)
     address = models.CharField(max_length=100)
@@ -38,22 +59,38 @@ class Affiliate(models.Model):
     has_legal_tutor = models.BooleanField(default=False)
     legal_tutor = models.ForeignKey('self', on_delete=models.RESTRICT, null=True, blank=True, related_name='tutor')
     active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Indexed by the affiliate_affiliate_search FTS5 table on SQLite, see CENDRA.search.create_fts_index
+    search_text = SearchTextField(sources=SEARCH_FIELDS, editable=False, default='')
+
+    objects = AffiliateQuerySet.as_manager()
 
     class Meta:
         ordering = ('census_number', 'pk')
+        indexes = [
+            models.Index(fields=['entity', 'census_number', 'id'], name='affiliate_entity_census'),
+            models.Index(fields=['entity', 'active', 'census_number', 'id'], name='affiliate_entity_active'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Partial saves of the searched fields also refresh the search text
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & set(SEARCH_FIELDS):
+            kwargs['update_fields'] = set(update_fields) | {'search_text'}
+        super(Affiliate, self).save(*args, **kwargs)
 
     def __str__(self):
         return str(self.name + " " + self.surnames)
     
     @property
     def position(self):
+        # Reuse the with_position() annotation or the select_related directorate when available
+        if 'position_name' in self.__dict__:
+            return self.position_name
         try:
-            position = Directorate.objects.get(user=self.id)
+            return self.directorate.position.name
         except Directorate.DoesNotExist:
-            position = None
-        if position is None:
-            return 'Vocal'
-        return position.position.name
+            return DEFAULT_POSITION
 
 class PaymentChoice(models.Model):
     def validate_iban(value):
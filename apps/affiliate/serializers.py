@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from CENDRA.utils import DynamicFieldsSerializer
+from CENDRA.utils import DynamicFieldsSerializer, ImageVariantField
 from apps.affiliate.models import Affiliate, PaymentChoice
 
 class PaymentChoiceSerializer(DynamicFieldsSerializer):
@@ -9,15 +9,19 @@ class PaymentChoiceSerializer(DynamicFieldsSerializer):
 
 class AffiliateSerializer(DynamicFieldsSerializer):
     photo = serializers.ImageField(required=False)
+    photo_thumb = ImageVariantField('thumb', source='photo')
+    photo_medium = ImageVariantField('medium', source='photo')
     payment_choice = PaymentChoiceSerializer(required=False)
     position = serializers.CharField(required=False)
+    # Annotated by Affiliate.objects.with_position()
+    field_sources = {'position': ('position_name',)}
 
     def get_position(self, instance):
         return self.position
     
     class Meta:
         model = Affiliate
-        exclude = ['entity']
+        exclude = ['entity', 'search_text']
 
 class PaymentChoiceCreateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -1,3 +1,502 @@
-from django.test import TestCase
+import base64
+import datetime
+import io
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+import xlsxwriter
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from CENDRA import images
+from CENDRA.compiled_serializers import compile_serializer
+from apps.entity.models import Entity, DirectoratePosition, Directorate
+from apps.user.models import CendraUser
+from .models import Affiliate, PaymentChoice
+from .serializers import AffiliateSerializer
 
-# Create your tests here.
+AFFILIATE_FIELDS = {'address': 'Calle', 'postal_code': '46001', 'city': 'Valencia', 'province': 'Valencia'}
+
+
+class AffiliatesPaginationTests(TestCase):
+    def setUp(self):
+        self.entity = Entity.objects.create(name='Falla', social_address='Calle Mayor 1', postal_code='46001', city='Valencia', province='Valencia')
+        # Repeated and missing values, so pages split rows that tie on the first ordering fields
+        rows = (
+            (3, 'Ana', 'Pérez', datetime.date(1990, 1, 1)),
+            (None, 'Luis', 'López', datetime.date(1990, 1, 1)),
+            (1, 'Eva', 'Pérez', datetime.date(1985, 5, 5)),
+            (None, 'Ana', 'López', datetime.date(2000, 2, 2)),
+            (2, 'Pau', 'Abad', datetime.date(1990, 1, 1)),
+            (3, 'Ana', 'Pérez', datetime.date(1970, 7, 7)),
+            (None, 'Eva', 'Zapata', datetime.date(1985, 5, 5)),
+        )
+        for i, (census_number, name, surnames, birthday) in enumerate(rows):
+            Affiliate.objects.create(entity=self.entity, census_number=census_number, name=name, surnames=surnames,
+                                     document_id='%08dA' % i, birthday=birthday, **AFFILIATE_FIELDS)
+        self.client = APIClient()
+        self.client.force_authenticate(CendraUser.objects.create_user('admin', 'admin@example.com', 'password', entity=self.entity))
+        cache.clear()
+
+    def get_pages(self, url):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([affiliate['id'] for affiliate in response.data['results']])
+            url = response.data['next']
+        return pages
+
+    def test_pages_neither_overlap_nor_skip_rows(self):
+        for sort in ('census_number', '-census_number', 'surnames', '-surnames', 'name', '-name', 'birthday', '-birthday'):
+            with self.subTest(sort=sort):
+                whole = self.get_pages('/api/private/affiliates?sort={0}'.format(sort))
+                self.assertEqual(len(whole), 1)
+                self.assertEqual(len(whole[0]), Affiliate.objects.count())
+                pages = self.get_pages('/api/private/affiliates?sort={0}&page_size=2'.format(sort))
+                self.assertEqual(len(pages), 4)
+                self.assertEqual(sum(pages, []), whole[0])
+
+    def test_nulls_sort_first_ascending_and_last_descending(self):
+        census = dict(Affiliate.objects.values_list('pk', 'census_number'))
+        ascending = sum(self.get_pages('/api/private/affiliates?page_size=2'), [])
+        self.assertEqual([census[pk] for pk in ascending], [None, None, None, 1, 2, 3, 3])
+        descending = sum(self.get_pages('/api/private/affiliates?sort=-census_number&page_size=2'), [])
+        self.assertEqual(descending, ascending[::-1])
+
+    def test_malformed_cursors_are_rejected(self):
+        def encode(position):
+            return base64.urlsafe_b64encode(json.dumps(position).encode('ascii')).decode('ascii')
+
+        cursors = (
+            'not base64!',
+            encode({'census_number': 1}),
+            encode([1]),
+            encode(['one', 2]),
+            encode([1, [2]]),
+            encode([1, 2 ** 70]),
+        )
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get('/api/private/affiliates', {'cursor': cursor}).status_code, 400)
+        response = self.client.get('/api/private/affiliates', {'sort': 'birthday', 'cursor': encode(['1990-13-01', 1])})
+        self.assertEqual(response.status_code, 400)
+
+
+class AffiliatesConditionalGetTests(TestCase):
+    def setUp(self):
+        entity = Entity.objects.create(name='Falla', social_address='Calle Mayor 1', postal_code='46001', city='Valencia', province='Valencia')
+        self.perez = Affiliate.objects.create(entity=entity, census_number=1, name='Ana', surnames='Pérez', document_id='00000001R',
+                                              birthday=datetime.date(1990, 1, 1), **AFFILIATE_FIELDS)
+        self.lopez = Affiliate.objects.create(entity=entity, census_number=2, name='Luis', surnames='López', document_id='00000002W',
+                                              birthday=datetime.date(1990, 1, 1), **AFFILIATE_FIELDS)
+        self.client = APIClient()
+        self.client.force_authenticate(CendraUser.objects.create_user('admin', 'admin@example.com', 'password', entity=entity))
+        cache.clear()
+
+    def get(self, etag):
+        return self.client.get('/api/private/affiliates', HTTP_IF_NONE_MATCH=etag)
+
+    def test_if_none_match_is_not_modified_while_the_affiliates_are_unchanged(self):
+        etag = self.client.get('/api/private/affiliates')['ETag']
+        self.assertEqual(self.get(etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.perez.phone = '600000000'
+            self.perez.save()
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['phone'], '600000000')
+        etag = response['ETag']
+        self.assertEqual(self.get(etag).status_code, 304)
+        # Deleting a row that is not the last updated one changes the count
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lopez.delete()
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+
+
+class AffiliatePhotoTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = media_root.name
+        settings = override_settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        entity = Entity.objects.create(name='Falla', social_address='Calle Mayor 1', postal_code='46001', city='Valencia', province='Valencia')
+        self.affiliate = Affiliate.objects.create(entity=entity, census_number=1, name='Ana', surnames='Pérez', document_id='00000001R',
+                                                  birthday=datetime.date(1990, 1, 1), **AFFILIATE_FIELDS)
+        self.client = APIClient()
+        self.client.force_authenticate(CendraUser.objects.create_user('admin', 'admin@example.com', 'password', entity=entity))
+        cache.clear()
+
+    def upload(self, size, executor=None):
+        photo = io.BytesIO()
+        exif = Image.Exif()
+        # Rotated a quarter turn, and tagged with a camera model that variants must not keep
+        exif[0x0112] = 6
+        exif[0x0110] = 'Camera'
+        Image.new('RGB', size, 'red').save(photo, 'JPEG', exif=exif)
+        photo.seek(0)
+        photo.name = 'photo.jpg'
+        executor = executor or ThreadPoolExecutor(1)
+        with mock.patch.object(images, 'executor', executor), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/private/user/photo?id={0}'.format(self.affiliate.id), {'file': photo}, format='multipart')
+        executor.shutdown(wait=True)
+        self.assertEqual(response.status_code, 201)
+        return response.data
+
+    def media_path(self, url):
+        return os.path.join(self.media_root, url[len('/media/'):])
+
+    def test_generates_variants_without_metadata(self):
+        data = self.upload((1000, 500))
+        self.assertEqual(data['photo_thumb'], data['photo'][:-len('.jpg')] + '_thumb.webp')
+        with Image.open(self.media_path(data['photo_thumb'])) as thumb:
+            self.assertEqual(thumb.size, (128, 128))
+            self.assertEqual(len(thumb.getexif()), 0)
+        with Image.open(self.media_path(data['photo_medium'])) as medium:
+            self.assertEqual(medium.size, (320, 640))
+
+    def test_replaced_photos_leave_no_variants_behind(self):
+        first = self.upload((300, 300))
+        second = self.upload((400, 400))
+        self.assertNotEqual(first['photo'], second['photo'])
+        self.assertFalse(os.path.exists(self.media_path(first['photo_thumb'])))
+        self.assertFalse(os.path.exists(self.media_path(first['photo_medium'])))
+        self.assertTrue(os.path.exists(self.media_path(second['photo_thumb'])))
+
+    def test_variant_urls_do_not_touch_the_storage(self):
+        self.upload((300, 300))
+        with mock.patch.object(FileSystemStorage, 'exists') as exists:
+            response = self.client.get('/api/private/affiliates')
+            self.assertEqual(response.status_code, 200)
+            affiliate = response.data['results'][0]
+            self.assertTrue(affiliate['photo_thumb'].endswith('_thumb.webp'))
+            exists.assert_not_called()
+        Affiliate.objects.create(entity=self.affiliate.entity, census_number=2, name='Luis', surnames='López', document_id='00000002W',
+                                 birthday=datetime.date(1990, 1, 1), **AFFILIATE_FIELDS)
+        default = self.client.get('/api/private/affiliates').data['results'][1]
+        self.assertEqual(default['photo_thumb'], default['photo'])
+
+    def test_missing_variants_are_served_as_the_original(self):
+        # Variants not generated yet
+        data = self.upload((300, 300), executor=mock.Mock())
+        response = self.client.get(data['photo_thumb'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('no-cache', response['Cache-Control'])
+        with open(self.media_path(data['photo']), 'rb') as original:
+            self.assertEqual(b''.join(response.streaming_content), original.read())
+        self.assertEqual(self.client.get(data['photo'][:-len('.jpg')] + '_large.webp').status_code, 404)
+
+
+class MediaFileTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings = override_settings(MEDIA_ROOT=media_root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.entity = Entity.objects.create(name='Falla', social_address='Calle Mayor 1', postal_code='46001', city='Valencia', province='Valencia')
+        self.other = Entity.objects.create(name='Otra', social_address='Calle Mayor 2', postal_code='46001', city='Valencia', province='Valencia')
+        self.client = APIClient()
+        self.client.force_authenticate(CendraUser.objects.create_user('admin', 'admin@example.com', 'password', entity=self.entity))
+        photo = io.BytesIO()
+        Image.new('RGB', (64, 64), 'red').save(photo, 'JPEG')
+        photo.seek(0)
+        photo.name = 'me.jpg'
+        with mock.patch.object(images, 'executor'), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/private/affiliates', {
+                'name': 'Ana', 'surnames': 'Pérez', 'document_id': '00000001R', 'birthday': '1990-01-01', 'photo': photo, **AFFILIATE_FIELDS
+            }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.affiliate = Affiliate.objects.get(pk=response.data['id'])
+        self.url = self.affiliate.photo.url
+        self.size = self.affiliate.photo.size
+
+    def test_photos_uploaded_at_creation_are_served(self):
+        self.assertEqual(self.affiliate.photo.name, 'avatar/user/{0}/photo.jpg'.format(self.affiliate.id))
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_only_members_of_the_entity_can_read_its_files(self):
+        self.assertEqual(APIClient().get(self.url).status_code, 401)
+        stranger = APIClient()
+        stranger.force_authenticate(CendraUser.objects.create_user('other', 'other@example.com', 'password', entity=self.other))
+        self.assertEqual(stranger.get(self.url).status_code, 404)
+        self.assertEqual(self.client.get('/media/avatar/user/{0}/../../../secret'.format(self.affiliate.id)).status_code, 404)
+        self.assertEqual(self.client.get('/media/avatar/user/None/photo.jpg').status_code, 404)
+
+    def test_entity_logos_are_public(self):
+        logo = io.BytesIO()
+        Image.new('RGB', (64, 64), 'blue').save(logo, 'PNG')
+        logo.name = 'logo.png'
+        logo.seek(0)
+        with mock.patch.object(images, 'executor'):
+            self.other.logo.save('logo.png', logo)
+        response = APIClient().get(self.other.logo.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('public', response['Cache-Control'])
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 0-9/{0}'.format(self.size))
+        self.assertEqual(len(b''.join(response.streaming_content)), 10)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(response['Content-Range'], 'bytes {0}-{1}/{2}'.format(self.size - 5, self.size - 1, self.size))
+        response = self.client.get(self.url, HTTP_RANGE='bytes={0}-'.format(self.size))
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */{0}'.format(self.size))
+        # A range of an older version of the file gets the whole new one
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_revalidation(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+    @override_settings(MEDIA_SERVE_MODE='x-accel', MEDIA_ACCEL_PREFIX='/protected-media/')
+    def test_proxy_offload(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.affiliate.photo.name)
+        self.assertEqual(response.content, b'')
+
+
+class AffiliateSearchTests(TestCase):
+    def setUp(self):
+        entity = Entity.objects.create(name='Falla', social_address='Calle Mayor 1', postal_code='46001', city='Valencia', province='Valencia')
+        other = Entity.objects.create(name='Otra', social_address='Calle Mayor 2', postal_code='46001', city='Valencia', province='Valencia')
+        fields = {'birthday': datetime.date(1990, 1, 1), 'address': 'Calle', 'postal_code': '46001', 'province': 'Valencia'}
+        self.nunez = Affiliate.objects.create(entity=entity, census_number=1, name='Íñigo', surnames='Núñez Peña', document_id='00000001R', city='Xàtiva', **fields)
+        self.garcia = Affiliate.objects.create(entity=entity, census_number=2, name='Inés', surnames='García', document_id='00000002W', city='Valencia', active=False, **fields)
+        Affiliate.objects.create(entity=other, census_number=1, name='Íñigo', surnames='Núñez', document_id='00000003A', city='Xàtiva', **fields)
+        self.client = APIClient()
+        self.client.force_authenticate(CendraUser.objects.create_user('admin', 'admin@example.com', 'password', entity=entity))
+        cache.clear()
+
+    def get_ids(self, query):
+        response = self.client.get('/api/private/affiliates?' + query)
+        self.assertEqual(response.status_code, 200)
+        return [affiliate['id'] for affiliate in response.data['results']]
+
+    def test_search_ignores_case_and_accents(self):
+        self.assertEqual(self.get_ids('search=INIGO%20nun'), [self.nunez.id])
+        self.assertEqual(self.get_ids('search=xativa'), [self.nunez.id])
+        self.assertEqual(self.get_ids('search=00000002'), [self.garcia.id])
+        self.assertEqual(self.get_ids('search=pena%20garcia'), [])
+
+    def test_search_follows_updates(self):
+        self.garcia.surnames = 'Peñalver'
+        self.garcia.save(update_fields=['surnames'])
+        self.assertEqual(self.get_ids('search=penalver'), [self.garcia.id])
+        self.assertEqual(self.get_ids('search=garcia'), [])
+        self.garcia.delete()
+        self.assertEqual(self.get_ids('search=penalver'), [])
+
+    def test_filters_and_sort(self):
+        self.assertEqual(self.get_ids('active=false'), [self.garcia.id])
+        self.assertEqual(self.get_ids('city=VALENCIA'), [self.garcia.id])
+        self.assertEqual(self.get_ids('document_id=00000001r'), [self.nunez.id])
+        self.assertEqual(self.get_ids('sort=surnames'), [self.garcia.id, self.nunez.id])
+        self.assertEqual(self.get_ids('sort=-census_number'), [self.garcia.id, self.nunez.id])
+        self.assertEqual(self.client.get('/api/private/affiliates?sort=photo').status_code, 400)
+
+
+class AffiliateSparseFieldsetTests(TestCase):
+    def setUp(self):
+        entity = Entity.objects.create(name='Falla', social_address='Calle Mayor 1', postal_code='46001', city='Valencia', province='Valencia')
+        fields = dict(birthday=datetime.date(1990, 1, 1), **AFFILIATE_FIELDS)
+        self.perez = Affiliate.objects.create(entity=entity, census_number=1, name='Ana', surnames='Pérez', document_id='00000001R', **fields)
+        self.lopez = Affiliate.objects.create(entity=entity, census_number=2, name='Luis', surnames='López', document_id='00000002W', **fields)
+        self.client = APIClient()
+        self.client.force_authenticate(CendraUser.objects.create_user('admin', 'admin@example.com', 'password', entity=entity))
+        cache.clear()
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, queries[-1]['sql']
+
+    def test_fields_narrow_the_sql(self):
+        response, sql = self.get('/api/private/affiliates?fields=id,name&sort=surnames&page_size=1')
+        self.assertEqual(response.data['results'], [{'id': self.lopez.id, 'name': 'Luis'}])
+        self.assertNotIn('document_id', sql)
+        self.assertNotIn('JOIN', sql)
+        response, sql = self.get(response.data['next'])
+        self.assertEqual(response.data['results'], [{'id': self.perez.id, 'name': 'Ana'}])
+        response, sql = self.get('/api/private/affiliates?fields=id,position')
+        self.assertEqual(response.data['results'][0], {'id': self.perez.id, 'position': 'Vocal'})
+
+    def test_unknown_fields_are_rejected(self):
+        self.assertEqual(self.client.get('/api/private/affiliates?fields=id,password').status_code, 400)
+
+
+class CompiledAffiliateSerializerTests(TestCase):
+    def setUp(self):
+        entity = Entity.objects.create(name='Falla', social_address='Calle Mayor 1', postal_code='46001', city='Valencia', province='Valencia')
+        fields = dict(birthday=datetime.date(1990, 1, 1), **AFFILIATE_FIELDS)
+        perez = Affiliate.objects.create(entity=entity, census_number=1, name='Ana', surnames='Pérez', document_id='00000001R', **fields)
+        Affiliate.objects.create(entity=entity, census_number=None, name='Luis', surnames='López', document_id='00000002W',
+                                 email='luis@example.com', **fields)
+        PaymentChoice.objects.create(affiliate=perez, payment_type=PaymentChoice.PaymentType.DOMICILATION, account_iban='ES9121000418450200051332')
+        position = DirectoratePosition.objects.create(name='Presidente', entity=entity, priority=1)
+        Directorate.objects.create(user=perez, position=position, entity=entity)
+        # Variant URLs are derived from the name, the file doesn't need to exist
+        Affiliate.objects.filter(pk=perez.pk).update(photo='avatar/affiliate/{0}/photo.png'.format(perez.pk))
+        self.affiliates = Affiliate.objects.filter(entity=entity).with_position()
+
+    def assertIdenticalOutput(self, fields=None):
+        queryset = AffiliateSerializer.restrict_queryset(self.affiliates, fields)
+        expected = JSONRenderer().render(AffiliateSerializer(queryset, many=True, fields=fields).data)
+        compiled = compile_serializer(AffiliateSerializer, fields)
+        self.assertEqual(JSONRenderer().render(compiled.serialize(compiled.values(self.affiliates))), expected)
+        return json.loads(expected)
+
+    def test_output_is_identical(self):
+        data = self.assertIdenticalOutput()
+        self.assertEqual([affiliate['position'] for affiliate in data], ['Vocal', 'Presidente'])
+        # Affiliates without a payment choice are serialized with payment_choice None
+        self.assertIsNone(data[0]['payment_choice'])
+        self.assertEqual(data[1]['payment_choice']['account_iban'], 'ES9121000418450200051332')
+        self.assertIdenticalOutput(fields=('id', 'name', 'surnames', 'census_number'))
+
+
+class ImportAffiliatesTests(TestCase):
+    header = 'name,surnames,document_type,document_id,birthday,address,postal_code,city,province,payment_type,account_iban,notes\n'
+
+    def setUp(self):
+        self.entity = Entity.objects.create(name='Falla', social_address='Calle Mayor 1', postal_code='46001', city='Valencia', province='Valencia')
+        self.user = CendraUser.objects.create_user('admin', 'admin@example.com', 'password', entity=self.entity, is_entity_admin=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        cache.clear()
+
+    def upload(self, content, name):
+        upload = io.BytesIO(content)
+        upload.name = name
+        return self.client.post('/api/private/affiliates/import', {'file': upload}, format='multipart')
+
+    def test_imports_valid_rows_and_reports_invalid_ones(self):
+        content = self.header + (
+            'Íñigo,Núñez,DNI,00000001R,1990-01-01,Calle,46001,Xàtiva,Valencia,Domiciliación bancaria,ES9121000418450200051332,x\n'
+            'Inés,García,1,00000002W,,Calle,46001,Valencia,Valencia,,,\n'
+            'Ana,Pérez,1,00000003A,1991-02-03,Calle,46001,Valencia,Valencia,9,ES9121000418450200051332,\n'
+            'Luis,López,2,00000004G,1992-03-04,Calle,46001,Valencia,Valencia,,,\n'
+        )
+        response = self.upload(content.encode('utf-8'), 'affiliates.csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([error['row'] for error in response.data['errors']], [3, 4])
+        self.assertIn('birthday', response.data['errors'][0]['errors'])
+        self.assertIn('payment_choice', response.data['errors'][1]['errors'])
+        self.assertEqual(response.data['ignored_columns'], ['notes'])
+        nunez = Affiliate.objects.get(document_id='00000001R', entity=self.entity)
+        self.assertEqual(nunez.payment_choice.payment_type, PaymentChoice.PaymentType.DOMICILATION)
+        self.assertEqual(nunez.payment_choice.account_iban, 'ES9121000418450200051332')
+        self.assertEqual(list(Affiliate.objects.search('nunez xativa')), [nunez])
+        self.assertFalse(PaymentChoice.objects.filter(affiliate__document_id='00000004G').exists())
+
+    def test_imports_xlsx(self):
+        output = io.BytesIO()
+        workbook = xlsxwriter.Workbook(output, {'in_memory': True})
+        worksheet = workbook.add_worksheet()
+        worksheet.write_row(0, 0, self.header.strip().split(','))
+        worksheet.write_row(1, 0, ('Íñigo', 'Núñez', 'DNI', '00000001R'))
+        worksheet.write_datetime(1, 4, datetime.datetime(1990, 1, 1), workbook.add_format({'num_format': 'yyyy-mm-dd'}))
+        worksheet.write_row(1, 5, ('Calle', 46001, 'Xàtiva', 'Valencia'))
+        workbook.close()
+        response = self.upload(output.getvalue(), 'affiliates.xlsx')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['errors'], [])
+        affiliate = Affiliate.objects.get(entity=self.entity)
+        self.assertEqual((affiliate.birthday, affiliate.postal_code), (datetime.date(1990, 1, 1), '46001'))
+
+    def test_rejects_other_files_and_users(self):
+        self.assertEqual(self.upload(b'name\n', 'affiliates.txt').status_code, 400)
+        self.assertEqual(self.upload(b'name\n', 'affiliates.xlsx').status_code, 400)
+        CendraUser.objects.filter(pk=self.user.pk).update(is_entity_admin=False)
+        self.user.refresh_from_db()
+        self.assertEqual(self.upload(self.header.encode('utf-8'), 'affiliates.csv').status_code, 401)
+
+
+class AffiliatesBatchTests(TestCase):
+    def setUp(self):
+        self.entity = Entity.objects.create(name='Falla', social_address='Calle Mayor 1', postal_code='46001', city='Valencia', province='Valencia')
+        other = Entity.objects.create(name='Otra', social_address='Calle Mayor 2', postal_code='46001', city='Valencia', province='Valencia')
+        fields = dict(birthday=datetime.date(1990, 1, 1), document_id='00000001R', **AFFILIATE_FIELDS)
+        self.perez = Affiliate.objects.create(entity=self.entity, census_number=7, name='Ana', surnames='Pérez', **fields)
+        self.lopez = Affiliate.objects.create(entity=self.entity, census_number=3, name='Luis', surnames='López', **fields)
+        self.new = Affiliate.objects.create(entity=self.entity, census_number=None, name='Eva', surnames='Zapata', **fields)
+        self.inactive = Affiliate.objects.create(entity=self.entity, census_number=1, name='Pau', surnames='Abad', active=False, **fields)
+        self.other = Affiliate.objects.create(entity=other, census_number=5, name='Íñigo', surnames='Núñez', **fields)
+        PaymentChoice.objects.create(affiliate=self.perez)
+        self.client = APIClient()
+        self.client.force_authenticate(CendraUser.objects.create_user('admin', 'admin@example.com', 'password', entity=self.entity, is_entity_admin=True))
+        cache.clear()
+
+    def post(self, data):
+        return self.client.post('/api/private/affiliates/batch', data, format='json')
+
+    def census(self):
+        return dict(Affiliate.objects.values_list('pk', 'census_number'))
+
+    def test_updates_all_or_nothing(self):
+        response = self.post({'operation': 'update', 'updates': [
+            {'id': self.perez.id, 'active': False},
+            {'id': self.other.id, 'active': False},
+            {'id': self.lopez.id, 'birthday': 'never'},
+        ]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2])
+        self.assertTrue(Affiliate.objects.get(pk=self.perez.id).active)
+
+        response = self.post({'operation': 'update', 'updates': [
+            {'id': self.perez.id, 'active': False},
+            {'id': self.lopez.id, 'surnames': 'Núñez'},
+        ]})
+        self.assertEqual(response.data, {'operation': 'update', 'updated': 2})
+        self.assertFalse(Affiliate.objects.get(pk=self.perez.id).active)
+        self.assertEqual(list(Affiliate.objects.filter(entity=self.entity).search('nunez')), [self.lopez])
+
+    def test_rejects_fields_that_cannot_be_updated(self):
+        response = self.post({'operation': 'update', 'updates': [
+            {'id': self.perez.id, 'activ': False},
+            {'id': self.lopez.id, 'photo': 'avatar.png', 'birthday': 'never'},
+            {'id': self.new.id, 'name': 'Eva María'},
+        ]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([(error['index'], sorted(error['errors'])) for error in response.data['errors']],
+                         [(0, ['activ']), (1, ['birthday', 'photo'])])
+        self.assertEqual(Affiliate.objects.get(pk=self.new.id).name, 'Eva')
+
+    def test_renumbers_active_affiliates_first(self):
+        response = self.post({'operation': 'renumber_census', 'sort': 'census_number'})
+        self.assertEqual(response.data, {'operation': 'renumber_census', 'updated': 4})
+        census = self.census()
+        # The inactive affiliate held number 1, it follows the active ones now
+        self.assertEqual([census[self.lopez.id], census[self.perez.id], census[self.new.id], census[self.inactive.id]], [1, 2, 3, 4])
+        self.assertEqual(census[self.other.id], 5)
+        self.post({'operation': 'renumber_census'})
+        census = self.census()
+        self.assertEqual([census[self.lopez.id], census[self.perez.id], census[self.new.id], census[self.inactive.id]], [1, 2, 3, 4])
+        self.assertEqual(self.post({'operation': 'renumber_census', 'sort': 'photo'}).status_code, 400)
+
+    def test_deactivates_affiliates_without_payment_choice(self):
+        response = self.post({'operation': 'deactivate_without_payment_choice'})
+        self.assertEqual(response.data, {'operation': 'deactivate_without_payment_choice', 'updated': 2})
+        self.assertEqual(set(Affiliate.objects.filter(active=True).values_list('pk', flat=True)), {self.perez.id, self.other.id})
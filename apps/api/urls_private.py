@@ -4,8 +4,8 @@ from rest_framework import permissions
 from drf_yasg import openapi
 from drf_yasg.generators import OpenAPISchemaGenerator
 from drf_yasg.views import get_schema_view
-from CENDRA.api_views import Dashboard
-from apps.affiliate.api_views import Affiliates, PaymentChoices, UpdatePhoto, ExportAffiliates
+from CENDRA.api_views import Dashboard, Metrics
+from apps.affiliate.api_views import Affiliates, PaymentChoices, UpdatePhoto, ExportAffiliates, ImportAffiliates, AffiliatesBatch
 from apps.entity.api_views import EntityPrivate, EntityJoin, DirectoratePositions, Directorates, CreateYearlyCensus
 from apps.news.api_views import News
 from apps.treasury.api_views import BankAccounts, Transactions
@@ -44,9 +44,12 @@ urlpatterns = [
     path('affiliates', Affiliates.as_view()),
     path('affiliates/paymentchoice', PaymentChoices.as_view()),
     path('affiliates/export', ExportAffiliates.as_view()),
+    path('affiliates/import', ImportAffiliates.as_view()),
+    path('affiliates/batch', AffiliatesBatch.as_view()),
     path('treasury', BankAccounts.as_view()),
     path('treasury/transactions', Transactions.as_view()),
     path('news', News.as_view()),
+    path('metrics', Metrics.as_view()),
     re_path(r'^swagger(?P<format>\.json|\.yaml)$', schema_view_private.without_ui(cache_timeout=0), name='schema-json'),
     re_path(r'^swagger/$', schema_view_private.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     re_path(r'^redoc/$', schema_view_private.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
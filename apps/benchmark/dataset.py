@@ -0,0 +1,156 @@
+import datetime
+import decimal
+import random
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+from CENDRA.cache import PUBLIC_SCOPE, bump_cache_version, entity_scope
+from apps.affiliate.models import Affiliate, PaymentChoice
+from apps.entity.models import Entity, DirectoratePosition, Directorate
+from apps.news.models import NewsItem
+from apps.treasury.models import BankAccount, Income, Outcome
+from apps.user.models import CendraUser
+
+# Password of the entity admin users, whose email is admin<entity id>@example.com
+PASSWORD = 'benchmark'
+BATCH_SIZE = 1000
+
+NAMES = ('José', 'María', 'Álvaro', 'Inés', 'Ramón', 'Lucía', 'Íñigo', 'Begoña', 'Jesús', 'Sofía',
+         'Vicente', 'Amparo', 'Óscar', 'Nuria', 'Joaquín', 'Rocío', 'Andrés', 'Mónica', 'Julián', 'Ángela')
+SURNAMES = ('García', 'Martínez', 'López', 'Sánchez', 'Pérez', 'Gómez', 'Jiménez', 'Hernández', 'Díaz', 'Muñoz',
+            'Álvarez', 'Romero', 'Ibáñez', 'Peña', 'Castaño', 'Navarro', 'Ferrándiz', 'Gil', 'Úbeda', 'Roig')
+CITIES = (('Valencia', '46001'), ('Alzira', '46600'), ('Gandia', '46700'), ('Sueca', '46410'), ('Torrent', '46900'),
+          ('Paterna', '46980'), ('Xàtiva', '46800'), ('Requena', '46340'), ('Burjassot', '46100'), ('Alcoi', '03801'))
+STREETS = ('Calle Mayor', 'Avenida del Puerto', 'Plaza de la Reina', 'Calle de la Paz', 'Camino Real', 'Calle San Vicente')
+POSITIONS = ('Presidente', 'Vicepresidente', 'Secretario', 'Tesorero')
+INCOME_CONCEPTS = ('Cuota', 'Lotería', 'Subvención', 'Patrocinio', 'Cena de hermandad')
+OUTCOME_CONCEPTS = ('Monumento', 'Pirotecnia', 'Banda de música', 'Indumentaria', 'Alquiler del casal', 'Flores')
+WORDS = ('la', 'comisión', 'de', 'fiestas', 'invita', 'a', 'todos', 'los', 'falleros', 'al', 'casal', 'para', 'la', 'presentación',
+         'del', 'boceto', 'y', 'la', 'cena', 'de', 'sobaquillo', 'el', 'sábado', 'por', 'la', 'noche', 'con', 'música', 'y', 'buñuelos')
+DNI_LETTERS = 'TRWAGMYFPDXBNJZSQVHLCKE'
+
+
+class DatasetGenerator:
+    """
+    Fills the database with realistic, reproducible entities and their data.
+
+    Rows are inserted with bulk_create, one transaction per entity. Bank account
+    balances are computed from the generated movements at the end.
+    """
+    def __init__(self, entities=1, affiliates=500, accounts=2, years=3, movements=20, news=50, seed=0):
+        self.entities = entities
+        self.affiliates = affiliates
+        self.accounts = accounts
+        self.years = years
+        self.movements = movements
+        self.news = news
+        self.random = random.Random(seed)
+        # Hashing is slow on purpose: compute it once for every user
+        self.password = make_password(PASSWORD)
+
+    def generate(self):
+        """
+        Returns the admin users of the generated entities.
+        """
+        users = [self.generate_entity(index) for index in range(self.entities)]
+        bump_cache_version(PUBLIC_SCOPE)
+        return users
+
+    @transaction.atomic
+    def generate_entity(self, index):
+        city, postal_code = self.random.choice(CITIES)
+        entity = Entity.objects.create(
+            name='Falla {0} {1}'.format(self.random.choice(STREETS), index + 1), social_address=self.address(),
+            postal_code=postal_code, city=city, province='Valencia', join_password='benchmark',
+        )
+        affiliates = Affiliate.objects.bulk_create((self.affiliate(entity, number) for number in range(1, self.affiliates + 1)), batch_size=BATCH_SIZE)
+        PaymentChoice.objects.bulk_create((self.payment_choice(affiliate) for affiliate in affiliates), batch_size=BATCH_SIZE)
+        positions = DirectoratePosition.objects.bulk_create(
+            DirectoratePosition(entity=entity, name=name, priority=priority) for priority, name in enumerate(POSITIONS, start=1)
+        )
+        Directorate.objects.bulk_create(
+            Directorate(entity=entity, user=affiliate, position=position) for affiliate, position in zip(affiliates, positions)
+        )
+        accounts = BankAccount.objects.bulk_create(
+            BankAccount(entity=entity, name='Cuenta {0}'.format(number), iban=self.iban(), initial_amount=self.amount(100, 5000))
+            for number in range(1, self.accounts + 1)
+        )
+        for account in accounts:
+            incomes, outcomes = self.account_movements(account)
+            Income.objects.bulk_create(incomes, batch_size=BATCH_SIZE)
+            Outcome.objects.bulk_create(outcomes, batch_size=BATCH_SIZE)
+        # bulk_create skips Movement.save(), which keeps the balances up to date
+        BankAccount.objects.filter(entity=entity).update(balance=BankAccount.expected_balance())
+        if affiliates:
+            NewsItem.objects.bulk_create((self.news_item(entity, affiliates) for _ in range(self.news)), batch_size=BATCH_SIZE)
+        user = CendraUser.objects.create(
+            username='admin{0}'.format(entity.pk), email='admin{0}@example.com'.format(entity.pk), password=self.password,
+            entity=entity, affiliate=affiliates[0] if affiliates else None, is_entity_admin=True,
+            onboarding=CendraUser.OnboardingStatus.COMPLETED,
+        )
+        Token.objects.get_or_create(user=user)
+        bump_cache_version(entity_scope(entity.pk))
+        return user
+
+    def affiliate(self, entity, census_number):
+        city, postal_code = self.random.choice(CITIES)
+        number = self.random.randrange(10 ** 8)
+        return Affiliate(
+            entity=entity,
+            census_number=census_number,
+            jcf_number=self.random.randrange(1, 10 ** 6),
+            name=self.random.choice(NAMES),
+            surnames='{0} {1}'.format(self.random.choice(SURNAMES), self.random.choice(SURNAMES)),
+            document_id='{0:08d}{1}'.format(number, DNI_LETTERS[number % 23]),
+            email='socio{0}@example.com'.format(census_number),
+            phone='6{0:08d}'.format(self.random.randrange(10 ** 8)),
+            birthday=datetime.date(1940, 1, 1) + datetime.timedelta(days=self.random.randrange(30000)),
+            gender=self.random.choice(Affiliate.Gender.values),
+            address=self.address(),
+            postal_code=postal_code,
+            city=city,
+            province='Valencia',
+            active=self.random.random() < 0.9,
+        )
+
+    def payment_choice(self, affiliate):
+        payment_type = self.random.choice(PaymentChoice.PaymentType.values)
+        if payment_type != PaymentChoice.PaymentType.DOMICILATION:
+            return PaymentChoice(affiliate=affiliate, payment_type=payment_type)
+        return PaymentChoice(affiliate=affiliate, payment_type=payment_type, account_holder=str(affiliate), account_iban=self.iban())
+
+    def account_movements(self, account):
+        incomes, outcomes = [], []
+        today = datetime.date.today()
+        for day in range(self.years * 365):
+            date = today - datetime.timedelta(days=day)
+            # About self.movements per month
+            for _ in range(self.random_count(self.movements / 30)):
+                if self.random.random() < 0.6:
+                    incomes.append(Income(account=account, concept=self.random.choice(INCOME_CONCEPTS), amount=self.amount(5, 500), date=date))
+                else:
+                    outcomes.append(Outcome(account=account, concept=self.random.choice(OUTCOME_CONCEPTS), amount=-self.amount(5, 900), date=date))
+        return incomes, outcomes
+
+    def news_item(self, entity, affiliates):
+        return NewsItem(
+            entity=entity,
+            author=self.random.choice(affiliates[:len(POSITIONS)]),
+            title='{0} de {1}'.format(self.random.choice(('Reunión', 'Asamblea', 'Cena', 'Cabalgata', 'Ofrenda')), self.random.choice(CITIES)[0]),
+            content=' '.join(self.random.choice(WORDS) for _ in range(self.random.randrange(40, 200))),
+        )
+
+    def random_count(self, mean):
+        count = int(mean)
+        if self.random.random() < mean - count:
+            count += 1
+        return count
+
+    def address(self):
+        return '{0} {1}'.format(self.random.choice(STREETS), self.random.randrange(1, 200))
+
+    def amount(self, low, high):
+        return decimal.Decimal(self.random.randrange(low * 100, high * 100)) / 100
+
+    def iban(self):
+        return 'ES{0:02d}{1:04d}{2:010d}'.format(self.random.randrange(100), self.random.randrange(10 ** 4), self.random.randrange(10 ** 10))
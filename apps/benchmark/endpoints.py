@@ -0,0 +1,219 @@
+import contextlib
+import csv
+import io
+import math
+import time
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from apps.affiliate.models import Affiliate
+from apps.api import urls_private, urls_public
+from apps.benchmark.dataset import PASSWORD
+from apps.news.models import NewsItem
+from apps.treasury.models import BankAccount
+
+PERCENTILES = (50, 95, 99)
+
+
+class Scenario:
+    """
+    A request to benchmark. The path is formatted with the ids of the dataset.
+
+    Write requests run in a transaction that is rolled back, so every
+    iteration sees the same data.
+    """
+    def __init__(self, method, path, data=None, format='json', write=False, label=None):
+        self.method = method
+        self.path = path
+        self.data = data
+        self.format = format
+        self.write = write
+        # Tells apart scenarios of the same request with different data
+        self.label = label
+
+    @property
+    def name(self):
+        name = '{0} {1}'.format(self.method, self.path)
+        return '{0} ({1})'.format(name, self.label) if self.label else name
+
+    def get_data(self):
+        return self.data() if callable(self.data) else self.data
+
+def photo_upload():
+    output = io.BytesIO()
+    Image.new('RGB', (640, 480), (200, 120, 40)).save(output, 'JPEG')
+    output.name = 'photo.jpg'
+    output.seek(0)
+    return {'file': output}
+
+def new_affiliate():
+    return {
+        'name': 'Benchmark', 'surnames': 'Núñez Peña', 'document_type': 1, 'document_id': '00000000T',
+        'birthday': '1990-01-01', 'address': 'Calle Mayor 1', 'postal_code': '46001', 'city': 'Valencia', 'province': 'Valencia',
+    }
+
+def affiliates_upload(rows=500):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(('census_number', 'name', 'surnames', 'document_type', 'document_id', 'birthday', 'address',
+                     'postal_code', 'city', 'province', 'payment_type'))
+    for number in range(rows):
+        writer.writerow((100000 + number, 'Benchmark', 'Núñez Peña', 'DNI', '{0:08d}T'.format(number), '1990-01-01',
+                         'Calle Mayor 1', '46001', 'Valencia', 'Valencia', 'Efectivo'))
+    upload = io.BytesIO(output.getvalue().encode('utf-8'))
+    upload.name = 'affiliates.csv'
+    return {'file': upload}
+
+SCENARIOS = (
+    Scenario('GET', '/api/private/dashboard'),
+    Scenario('GET', '/api/private/user'),
+    Scenario('PATCH', '/api/private/user', {'entity': '{entity}', 'join_password': 'benchmark'}, write=True),
+    Scenario('POST', '/api/private/user/affiliate', new_affiliate, write=True),
+    Scenario('POST', '/api/private/user/photo', photo_upload, format='multipart', write=True),
+    Scenario('GET', '/api/private/entity'),
+    Scenario('PATCH', '/api/private/entity', {'phone': '960000000'}, write=True),
+    Scenario('POST', '/api/private/entity/join', {'id': '{entity}', 'password': 'benchmark'}, write=True),
+    Scenario('GET', '/api/private/entity/positions'),
+    Scenario('GET', '/api/private/entity/directorate'),
+    Scenario('POST', '/api/private/entity/census', write=True),
+    Scenario('GET', '/api/private/affiliates'),
+    Scenario('GET', '/api/private/affiliates?page_size=500'),
+    Scenario('GET', '/api/private/affiliates?id={affiliate}'),
+    Scenario('GET', '/api/private/affiliates?search=garcia%20jose'),
+    Scenario('GET', '/api/private/affiliates?active=true&city=valencia&sort=surnames'),
+    Scenario('GET', '/api/private/affiliates?page_size=500&fields=id,name,surnames,census_number'),
+    Scenario('POST', '/api/private/affiliates', new_affiliate, write=True),
+    Scenario('PATCH', '/api/private/affiliates?id={affiliate}', {'phone': '600000000'}, write=True),
+    Scenario('GET', '/api/private/affiliates/paymentchoice?affiliate={affiliate}'),
+    Scenario('GET', '/api/private/affiliates/export'),
+    Scenario('POST', '/api/private/affiliates/import', affiliates_upload, format='multipart', write=True),
+    Scenario('POST', '/api/private/affiliates/batch', {'operation': 'update', 'updates': [{'id': '{affiliate}', 'active': False, 'surnames': 'Núñez'}]},
+             write=True, label='update'),
+    Scenario('POST', '/api/private/affiliates/batch', {'operation': 'renumber_census', 'sort': 'surnames'}, write=True, label='renumber_census'),
+    Scenario('POST', '/api/private/affiliates/batch', {'operation': 'deactivate_without_payment_choice'}, write=True,
+             label='deactivate_without_payment_choice'),
+    Scenario('GET', '/api/private/treasury'),
+    Scenario('GET', '/api/private/treasury/transactions?account={account}'),
+    Scenario('GET', '/api/private/treasury/transactions?account={account}&from={year}-01-01&to={year}-12-31'),
+    Scenario('GET', '/api/private/news'),
+    Scenario('GET', '/api/private/news?fields=id,title,created_at&expand=author'),
+    Scenario('GET', '/api/private/news?id={news}'),
+    Scenario('GET', '/api/private/metrics'),
+    Scenario('GET', '/api/private/swagger.json'),
+    Scenario('GET', '/api/private/swagger/'),
+    Scenario('GET', '/api/private/redoc/'),
+    Scenario('POST', '/api/public/register', {'email': 'benchmark@example.com', 'password': 'benchmark'}, write=True),
+    Scenario('GET', '/api/public/entities'),
+    Scenario('GET', '/api/public/entities?id={entity}'),
+    Scenario('POST', '/api/public/token', {'username': '{email}', 'password': PASSWORD}, write=True),
+    Scenario('GET', '/api/public/swagger.json'),
+    Scenario('GET', '/api/public/swagger/'),
+    Scenario('GET', '/api/public/redoc/'),
+)
+
+def uncovered_urls(scenarios=SCENARIOS):
+    """
+    Returns the API URL patterns that no scenario requests.
+    """
+    views = {resolve(scenario.path.split('?')[0]).func for scenario in scenarios}
+    return [pattern for pattern in urls_private.urlpatterns + urls_public.urlpatterns if pattern.callback not in views]
+
+def get_ids(user):
+    account = BankAccount.objects.filter(entity=user.entity_id).order_by('pk').first()
+    news = NewsItem.objects.filter(entity=user.entity_id).order_by('pk').first()
+    return {
+        'entity': user.entity_id,
+        'email': user.email,
+        'affiliate': Affiliate.objects.filter(entity=user.entity_id).order_by('pk').values_list('pk', flat=True).first(),
+        'account': account.pk if account else None,
+        'news': news.pk if news else None,
+        'year': time.localtime().tm_year,
+    }
+
+def format_data(data, ids):
+    if isinstance(data, str):
+        return data.format(**ids)
+    if isinstance(data, dict):
+        return {key: format_data(value, ids) for key, value in data.items()}
+    if isinstance(data, list):
+        return [format_data(value, ids) for value in data]
+    return data
+
+def percentile(values, rank):
+    # Nearest-rank method: always one of the measured values
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(rank / 100 * len(ordered)) - 1)]
+
+def send(client, scenario, ids):
+    path = scenario.path.format(**ids)
+    if scenario.method == 'GET':
+        response = client.get(path)
+    else:
+        method = getattr(client, scenario.method.lower())
+        response = method(path, format_data(scenario.get_data(), ids), format=scenario.format)
+    if response.streaming:
+        # Include the time to stream the body, like a real client
+        for _ in response.streaming_content:
+            pass
+        response.close()
+    return response
+
+def run_scenario(client, scenario, ids, iterations, warmup, warm_cache):
+    durations = []
+    queries = 0
+    status = None
+    for iteration in range(warmup + iterations):
+        if not warm_cache:
+            cache.clear()
+        with transaction.atomic() if scenario.write else contextlib.nullcontext():
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = send(client, scenario, ids)
+                duration = time.perf_counter() - start
+            if scenario.write:
+                transaction.set_rollback(True)
+        if iteration >= warmup:
+            durations.append(duration)
+            queries = max(queries, len(captured))
+            status = response.status_code
+    result = {'status': status, 'queries': queries}
+    for rank in PERCENTILES:
+        result['p{0}'.format(rank)] = round(percentile(durations, rank) * 1000, 3)
+    return result
+
+def run_benchmark(user, iterations=20, warmup=2, warm_cache=False, scenarios=SCENARIOS):
+    """
+    Requests every scenario as the given entity admin, returns their results by name.
+
+    Latency percentiles are in milliseconds. With warm_cache the response cache
+    is kept between iterations, so cached views are measured on their hits.
+    The metrics endpoint is only served to staff users.
+    """
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.get(user=user).key)
+    ids = get_ids(user)
+    return {scenario.name: run_scenario(client, scenario, ids, iterations, warmup, warm_cache) for scenario in scenarios}
+
+def find_regressions(results, baseline, tolerance=0.2, min_delta=2.0):
+    """
+    Compares results with a baseline, returns a description of each regression.
+
+    A latency regression needs the p95 to grow both by the tolerance ratio and
+    by min_delta milliseconds, which keeps noise on fast endpoints out.
+    """
+    regressions = []
+    for name, expected in baseline.items():
+        result = results.get(name)
+        if result is None:
+            continue
+        if result['status'] != expected['status']:
+            regressions.append('{0}: status {1}, was {2}'.format(name, result['status'], expected['status']))
+        if result['queries'] > expected['queries']:
+            regressions.append('{0}: {1} queries, was {2}'.format(name, result['queries'], expected['queries']))
+        if result['p95'] > expected['p95'] * (1 + tolerance) and result['p95'] - expected['p95'] > min_delta:
+            regressions.append('{0}: p95 {1:.1f}ms, was {2:.1f}ms'.format(name, result['p95'], expected['p95']))
+    return regressions
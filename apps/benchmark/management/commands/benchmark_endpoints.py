@@ -0,0 +1,71 @@
+import json
+import os
+import tempfile
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from apps.benchmark.dataset import DatasetGenerator
+from apps.benchmark.endpoints import find_regressions, run_benchmark, uncovered_urls
+from apps.user.models import CendraUser
+
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'apps', 'benchmark', 'baseline.json')
+
+
+class Command(BaseCommand):
+    help = ('Requests every API endpoint against a generated dataset in a test database, reports latency percentiles '
+            'and query counts and compares them with a baseline.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--affiliates', type=int, default=1000, help='Affiliates of the benchmarked entity.')
+        parser.add_argument('--years', type=int, default=3, help='Years of transactions of each bank account.')
+        parser.add_argument('--movements', type=int, default=20, help='Transactions per month of each bank account.')
+        parser.add_argument('--news', type=int, default=50, help='News items of the benchmarked entity.')
+        parser.add_argument('--iterations', type=int, default=20, help='Measured requests per endpoint.')
+        parser.add_argument('--warmup', type=int, default=2, help='Unmeasured requests per endpoint.')
+        parser.add_argument('--warm-cache', action='store_true', help='Keep the response cache between requests.')
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='JSON file with the baseline results.')
+        parser.add_argument('--save', action='store_true', help='Write the results as the new baseline.')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed p95 latency growth ratio.')
+        parser.add_argument('--min-delta', type=float, default=2.0, help='Ignore p95 latency growths below these milliseconds.')
+
+    def handle(self, *args, **options):
+        for pattern in uncovered_urls():
+            self.stdout.write(self.style.WARNING('Not benchmarked: {0}'.format(pattern.pattern)))
+        scale = {name: options[name] for name in ('affiliates', 'years', 'movements', 'news', 'warm_cache')}
+        results = self.benchmark(scale, options['iterations'], options['warmup'])
+        self.stdout.write('{0:<90} {1:>6} {2:>7} {3:>9} {4:>9} {5:>9}'.format('Endpoint', 'Status', 'Queries', 'p50 ms', 'p95 ms', 'p99 ms'))
+        for name, result in results.items():
+            self.stdout.write('{0:<90} {status:>6} {queries:>7} {p50:>9.1f} {p95:>9.1f} {p99:>9.1f}'.format(name, **result))
+
+        if options['save']:
+            with open(options['baseline'], 'w') as output:
+                json.dump({'scale': scale, 'results': results}, output, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS('Baseline saved to {0}.'.format(options['baseline'])))
+            return
+        if not os.path.exists(options['baseline']):
+            self.stdout.write(self.style.WARNING('No baseline at {0}, run with --save to create it.'.format(options['baseline'])))
+            return
+        with open(options['baseline']) as source:
+            baseline = json.load(source)
+        if baseline['scale'] != scale:
+            self.stdout.write(self.style.WARNING('The baseline was measured with {0}.'.format(baseline['scale'])))
+        regressions = find_regressions(results, baseline['results'], options['tolerance'], options['min_delta'])
+        if regressions:
+            raise CommandError('Regressions against the baseline:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
+
+    def benchmark(self, scale, iterations, warmup):
+        # Never touch the real database or media: generate the data in a throwaway test database
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+                generator = DatasetGenerator(affiliates=scale['affiliates'], years=scale['years'], movements=scale['movements'], news=scale['news'])
+                user = generator.generate()[0]
+                # Site administrators can also read the metrics endpoint
+                CendraUser.objects.filter(pk=user.pk).update(is_staff=True)
+                return run_benchmark(user, iterations, warmup, scale['warm_cache'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
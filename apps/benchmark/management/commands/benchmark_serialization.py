@@ -0,0 +1,38 @@
+import tempfile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from apps.benchmark.dataset import DatasetGenerator
+from apps.benchmark.serialization import run_serialization_benchmark
+
+
+class Command(BaseCommand):
+    help = ('Renders large lists with the serializers and with their compiled plans against a generated dataset '
+            'in a test database, and checks both outputs are identical.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Affiliates and news items of the rendered lists.')
+        parser.add_argument('--iterations', type=int, default=5, help='Renders of each list, the best one is reported.')
+
+    def handle(self, *args, **options):
+        results = self.benchmark(options['rows'], options['iterations'])
+        self.stdout.write('{0:<60} {1:>6} {2:>14} {3:>12} {4:>8}'.format('List', 'Rows', 'Serializer ms', 'Compiled ms', 'Speedup'))
+        for name, result in results.items():
+            self.stdout.write('{0:<60} {rows:>6} {serializer:>14.1f} {compiled:>12.1f} {1:>7.1f}x'.format(
+                name, result['serializer'] / result['compiled'], **result
+            ))
+        different = [name for name, result in results.items() if not result['identical']]
+        if different:
+            raise CommandError('The compiled output differs from the serializer output: ' + ', '.join(different))
+
+    def benchmark(self, rows, iterations):
+        # Never touch the real database or media: generate the data in a throwaway test database
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+                user = DatasetGenerator(affiliates=rows, years=1, movements=1, news=rows).generate()[0]
+                return run_serialization_benchmark(user.entity_id, rows, iterations)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
@@ -0,0 +1,77 @@
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from CENDRA.db.sqlite3.base import apply_pragmas
+
+READS_PER_REQUEST = 4
+
+
+def connect(name, profile):
+    # Django runs in autocommit mode and opens its own transactions
+    conn = sqlite3.connect(name, isolation_level=None)
+    if profile:
+        apply_pragmas(conn, settings.SQLITE_PERFORMANCE_PROFILE['PRAGMAS'])
+    return conn
+
+def run_worker(name, profile, rows, write_ratio, deadline):
+    """
+    Serves simulated requests until the deadline, returns (requests, locked errors).
+    """
+    begin = 'BEGIN IMMEDIATE' if profile else 'BEGIN'
+    conn = connect(name, profile)
+    requests = errors = 0
+    while time.monotonic() < deadline:
+        if not profile:
+            # Without CONN_MAX_AGE every request opens a new connection
+            conn.close()
+            conn = connect(name, profile)
+        try:
+            for _ in range(READS_PER_REQUEST):
+                conn.execute('SELECT * FROM bench WHERE entity = ? ORDER BY id LIMIT 20', (random.randrange(10),)).fetchall()
+            if random.random() < write_ratio:
+                pk = random.randrange(1, rows + 1)
+                conn.execute(begin)
+                row = conn.execute('SELECT value FROM bench WHERE id = ?', (pk,)).fetchone()
+                conn.execute('UPDATE bench SET value = ? WHERE id = ?', (row[0] + 1, pk))
+                conn.execute('COMMIT')
+            requests += 1
+        except sqlite3.OperationalError:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            errors += 1
+    conn.close()
+    return requests, errors
+
+
+class Command(BaseCommand):
+    help = 'Compares the mixed read/write throughput of SQLite with and without the performance profile.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Concurrent worker processes.')
+        parser.add_argument('--duration', type=float, default=5, help='Seconds each profile is measured.')
+        parser.add_argument('--rows', type=int, default=10000, help='Rows of the benchmark table.')
+        parser.add_argument('--write-ratio', type=float, default=0.2, help='Fraction of requests that also write.')
+
+    def handle(self, *args, **options):
+        for profile in (False, True):
+            with tempfile.TemporaryDirectory() as directory:
+                name = os.path.join(directory, 'benchmark.sqlite3')
+                conn = connect(name, profile)
+                conn.execute('CREATE TABLE bench (id INTEGER PRIMARY KEY, entity INTEGER, value INTEGER, payload TEXT)')
+                conn.execute('CREATE INDEX bench_entity ON bench (entity, id)')
+                conn.executemany('INSERT INTO bench (entity, value, payload) VALUES (?, 0, ?)', ((i % 10, 'x' * 200) for i in range(options['rows'])))
+                conn.close()
+                deadline = time.monotonic() + options['duration']
+                arguments = [(name, profile, options['rows'], options['write_ratio'], deadline)] * options['workers']
+                with multiprocessing.Pool(options['workers']) as pool:
+                    results = pool.starmap(run_worker, arguments)
+            requests = sum(result[0] for result in results)
+            errors = sum(result[1] for result in results)
+            self.stdout.write('{0}: {1:.0f} requests/s, {2} locked errors'.format(
+                'performance' if profile else 'default', requests / options['duration'], errors
+            ))
@@ -0,0 +1,27 @@
+import time
+from django.core.management.base import BaseCommand
+from apps.benchmark.dataset import PASSWORD, DatasetGenerator
+
+
+class Command(BaseCommand):
+    help = 'Fills the database with synthetic entities, affiliates, bank accounts and news.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entities', type=int, default=1, help='Entities to create.')
+        parser.add_argument('--affiliates', type=int, default=500, help='Affiliates of each entity.')
+        parser.add_argument('--accounts', type=int, default=2, help='Bank accounts of each entity.')
+        parser.add_argument('--years', type=int, default=3, help='Years of transactions of each bank account.')
+        parser.add_argument('--movements', type=int, default=20, help='Transactions per month of each bank account.')
+        parser.add_argument('--news', type=int, default=50, help='News items of each entity.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, the same seed generates the same data.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        generator = DatasetGenerator(
+            entities=options['entities'], affiliates=options['affiliates'], accounts=options['accounts'],
+            years=options['years'], movements=options['movements'], news=options['news'], seed=options['seed'],
+        )
+        users = generator.generate()
+        for user in users:
+            self.stdout.write('Entity {0}: log in as {1} with password "{2}"'.format(user.entity_id, user.email, PASSWORD))
+        self.stdout.write(self.style.SUCCESS('{0} entities generated in {1:.1f}s.'.format(len(users), time.perf_counter() - start)))
@@ -0,0 +1,61 @@
+import time
+from rest_framework.renderers import JSONRenderer
+from CENDRA.compiled_serializers import compile_serializer
+from apps.affiliate.models import Affiliate
+from apps.affiliate.serializers import AffiliateSerializer
+from apps.news.models import NewsItem
+from apps.news.serializers import NewsSerializer
+
+
+class SerializationCase:
+    """
+    A list rendered by a serializer and by its compiled plan.
+    """
+    def __init__(self, name, serializer_class, queryset, fields=None, expand=()):
+        self.name = name
+        self.serializer_class = serializer_class
+        self.queryset = queryset
+        self.fields = fields
+        self.expand = expand
+
+    def render_serializer(self, entity_id, limit):
+        queryset = self.serializer_class.restrict_queryset(self.queryset(entity_id), self.fields, self.expand)
+        return JSONRenderer().render(self.serializer_class(queryset[:limit], many=True, fields=self.fields, expand=self.expand).data)
+
+    def render_compiled(self, entity_id, limit):
+        compiled = compile_serializer(self.serializer_class, self.fields, self.expand)
+        return JSONRenderer().render(compiled.serialize(compiled.values(self.queryset(entity_id))[:limit]))
+
+CASES = (
+    SerializationCase('affiliates', AffiliateSerializer, lambda entity_id: Affiliate.objects.filter(entity=entity_id).with_position()),
+    SerializationCase('affiliates?fields=id,name,surnames,census_number', AffiliateSerializer,
+                      lambda entity_id: Affiliate.objects.filter(entity=entity_id), fields=('id', 'name', 'surnames', 'census_number')),
+    SerializationCase('news?expand=author', NewsSerializer, lambda entity_id: NewsItem.objects.filter(entity=entity_id), expand=('author',)),
+)
+
+def run_serialization_benchmark(entity_id, rows=10000, iterations=5, cases=CASES):
+    """
+    Renders every case with the serializer and with the compiled plan, returns their results by name.
+
+    Times are the best of the iterations in milliseconds, including the query.
+    Both outputs must be identical.
+    """
+    results = {}
+    for case in cases:
+        timings = {}
+        outputs = {}
+        for mode in ('serializer', 'compiled'):
+            render = getattr(case, 'render_' + mode)
+            best = float('inf')
+            for _ in range(iterations):
+                start = time.perf_counter()
+                outputs[mode] = render(entity_id, rows)
+                best = min(best, time.perf_counter() - start)
+            timings[mode] = best * 1000
+        results[case.name] = {
+            'rows': min(rows, case.queryset(entity_id).count()),
+            'serializer': timings['serializer'],
+            'compiled': timings['compiled'],
+            'identical': outputs['serializer'] == outputs['compiled'],
+        }
+    return results
@@ -0,0 +1,180 @@
+import datetime
+import os
+import re
+import tempfile
+from unittest import mock
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from prometheus_client import REGISTRY
+from rest_framework.test import APIClient
+from CENDRA.query_budget import QueryBudgetExceeded
+from apps.affiliate.models import Affiliate, PaymentChoice
+from apps.benchmark.dataset import DatasetGenerator
+from apps.benchmark.endpoints import find_regressions, run_benchmark, uncovered_urls
+from apps.entity.models import Entity, DirectoratePosition, Directorate
+from apps.news.models import NewsItem
+from apps.treasury.api_views import BankAccounts
+from apps.treasury.models import BankAccount, Income, Outcome
+from apps.user.models import CendraUser
+
+# Matches full table scans, but not lookups, scans of temporary results or full-text index queries
+FULL_SCAN = re.compile(r'^SCAN (?!CONSTANT ROW)(?!\()(\S+)(?!\S| VIRTUAL TABLE)')
+
+
+class QueryPlanTests(TestCase):
+    """
+    Runs every API view and checks that none of its queries scans a whole table.
+    """
+    # Views that list a whole table on purpose
+    allowed_scans = {
+        '/api/public/entities': {'entity_entity'},
+    }
+
+    def setUp(self):
+        entity = Entity.objects.create(name='Falla', social_address='Calle Mayor 1', postal_code='46001', city='Valencia', province='Valencia')
+        position = DirectoratePosition.objects.create(name='Presidente', entity=entity, priority=1)
+        self.affiliate = Affiliate.objects.create(entity=entity, census_number=1, name='Nombre', surnames='Apellido', document_id='00000001A',
+                                                  birthday=datetime.date(1990, 1, 1), address='Calle', postal_code='46001', city='Valencia', province='Valencia')
+        PaymentChoice.objects.create(affiliate=self.affiliate)
+        Directorate.objects.create(user=self.affiliate, position=position, entity=entity)
+        self.account = BankAccount.objects.create(entity=entity, name='Caja')
+        Income.objects.create(account=self.account, concept='Cuota', amount=10, date=datetime.date(2023, 2, 1))
+        Outcome.objects.create(account=self.account, concept='Traca', amount=-5, date=datetime.date(2023, 3, 1))
+        self.news_item = NewsItem.objects.create(entity=entity, title='Titulo', content='Contenido', author=self.affiliate)
+        user = CendraUser.objects.create_user('admin', 'admin@example.com', 'password', entity=entity, affiliate=self.affiliate, is_entity_admin=True)
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        cache.clear()
+
+    def get_plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[3] for row in cursor.fetchall()]
+
+    def assertNoFullScans(self, method, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url)
+        self.assertLess(response.status_code, 300)
+        allowed = self.allowed_scans.get(url, set())
+        for query in queries.captured_queries:
+            if not query['sql'].startswith('SELECT'):
+                continue
+            plan = self.get_plan(query['sql'])
+            scans = {match.group(1) for match in map(FULL_SCAN.match, plan) if match} - allowed
+            self.assertFalse(scans, '{0} {1} scans {2}:\n{3}\n{4}'.format(method.upper(), url, ', '.join(scans), query['sql'], '\n'.join(plan)))
+
+    def test_views_do_not_scan_whole_tables(self):
+        urls = (
+            '/api/public/entities',
+            '/api/private/dashboard',
+            '/api/private/user',
+            '/api/private/entity',
+            '/api/private/entity/positions',
+            '/api/private/entity/directorate',
+            '/api/private/affiliates',
+            '/api/private/affiliates?id={0}'.format(self.affiliate.id),
+            '/api/private/affiliates?search=apellido%20nom',
+            '/api/private/affiliates?active=true&city=valencia&sort=surnames',
+            '/api/private/affiliates?document_id=00000001a&sort=-birthday',
+            '/api/private/affiliates/paymentchoice?affiliate={0}'.format(self.affiliate.id),
+            '/api/private/affiliates/export',
+            '/api/private/treasury',
+            '/api/private/treasury/transactions?account={0}'.format(self.account.id),
+            '/api/private/treasury/transactions?account={0}&from=2023-01-01&to=2023-12-31'.format(self.account.id),
+            '/api/private/news',
+            '/api/private/news?id={0}'.format(self.news_item.id),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertNoFullScans('get', url)
+
+    def test_census_does_not_scan_whole_tables(self):
+        self.assertNoFullScans('post', '/api/private/entity/census')
+        self.assertNoFullScans('post', '/api/private/entity/census')
+
+
+class EndpointBenchmarkTests(TestCase):
+    """
+    Runs the endpoint benchmark on a small generated dataset.
+    """
+    def setUp(self):
+        self.user = DatasetGenerator(affiliates=20, years=1, movements=5, news=5).generate()[0]
+        CendraUser.objects.filter(pk=self.user.pk).update(is_staff=True)
+        cache.clear()
+
+    def test_dataset_balances_match_movements(self):
+        accounts = BankAccount.objects.annotate(expected=BankAccount.expected_balance())
+        for balance, expected in accounts.values_list('balance', 'expected'):
+            self.assertEqual(balance, expected)
+
+    def test_every_url_is_benchmarked(self):
+        self.assertEqual(uncovered_urls(), [])
+
+    # The API docs pages link their static files through the collectstatic manifest
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_benchmark_requests_succeed(self):
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            results = run_benchmark(self.user, iterations=1, warmup=0)
+        for name, result in results.items():
+            with self.subTest(endpoint=name):
+                self.assertLess(result['status'], 400)
+        self.assertEqual(find_regressions(results, results), [])
+
+
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        entity = Entity.objects.create(name='Falla', social_address='Calle Mayor 1', postal_code='46001', city='Valencia', province='Valencia')
+        BankAccount.objects.create(entity=entity, name='Caja')
+        self.client = APIClient()
+        self.client.force_authenticate(CendraUser.objects.create_user('admin', 'admin@example.com', 'password', entity=entity))
+        cache.clear()
+
+    def get_violations(self):
+        return REGISTRY.get_sample_value('cendra_query_budget_violations_total', {'method': 'GET', 'route': '/api/private/treasury'}) or 0
+
+    @mock.patch.object(BankAccounts, 'query_budget', 0)
+    @override_settings(QUERY_BUDGET_ACTION='raise')
+    def test_raises_over_budget(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get('/api/private/treasury')
+
+    @mock.patch.object(BankAccounts, 'query_budget', 0)
+    @override_settings(QUERY_BUDGET_ACTION='record')
+    def test_records_over_budget(self):
+        violations = self.get_violations()
+        response = self.client.get('/api/private/treasury')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_violations(), violations + 1)
+
+    @override_settings(QUERY_BUDGET_ACTION='raise')
+    def test_affiliate_handlers_fit_the_view_budget(self):
+        # The budget of Affiliates covers its reads and its writes
+        response = self.client.post('/api/private/affiliates', {'name': 'Ana', 'surnames': 'Pérez', 'document_id': '00000001R', 'birthday': '1990-01-01',
+                                                                'address': 'Calle', 'postal_code': '46001', 'city': 'Valencia', 'province': 'Valencia'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.client.get('/api/private/affiliates').status_code, 200)
+        response = self.client.patch('/api/private/affiliates?id={0}'.format(response.data['id']), {'name': 'Eva'}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+
+class AsyncMiddlewareTests(TestCase):
+    @override_settings(DEBUG=True)
+    def test_middleware_chain_is_not_adapted(self):
+        # Django only logs the adapted middleware in debug mode
+        with self.assertNoLogs('django.request', 'DEBUG'):
+            ASGIHandler()
+
+    async def test_serves_static_files_asynchronously(self):
+        with tempfile.TemporaryDirectory() as static_root, override_settings(STATIC_ROOT=static_root):
+            with open(os.path.join(static_root, 'app.js'), 'w') as file:
+                file.write('cendra();' * 10000)
+            response = await self.async_client.get('/static/app.js')
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.is_async)
+            self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), b'cendra();' * 10000)
+            response = await self.async_client.get('/api/public/entities')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('desc="1 queries"', response['Server-Timing'])
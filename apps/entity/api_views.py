@@ -1,6 +1,7 @@
 from io import BytesIO
 import xlsxwriter
 import datetime
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from rest_framework import status
 from rest_framework.views import APIView
@@ -8,41 +9,50 @@ from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
+from CENDRA.cache import cache_response, request_public_scope
+from CENDRA.utils import SPARSE_FIELDSET_PARAMETERS, get_sparse_fieldset
 from apps.affiliate.models import Affiliate
 from .models import Entity, DirectoratePosition, Directorate, YearlyCensus, YearlyCensusEntry
 from .serializers import EntitySerializer, DirectoratePositionSerializer, DirectorateSerializer
 
+PUBLIC_ENTITY_FIELDS = ('id', 'name', 'logo', 'logo_thumb')
+
 class EntityPublic(APIView):
+    query_budget = 3
     permission_classes = [AllowAny]
 
     @swagger_auto_schema(
         manual_parameters=[
             openapi.Parameter('id', openapi.IN_QUERY, description="Entity ID to retrieve", type=openapi.TYPE_INTEGER, required=False)
-        ],
+        ] + SPARSE_FIELDSET_PARAMETERS[:1],
         responses={
-            200: openapi.Response("Successful request.", EntitySerializer(fields=('id', 'name', 'logo'))),
+            200: openapi.Response("Successful request.", EntitySerializer(fields=PUBLIC_ENTITY_FIELDS)),
             400: openapi.Response("Bad request."),
         }
     )
+    @cache_response(scope=request_public_scope)
     def get(self, request, *args, **kwargs):
         """
         Returns an array of entities with basic info only. 
 
         If query param 'id' is provided, returns only one object.
+        Query param 'fields' narrows the list to some of the basic fields.
         """
         entity_id = self.request.query_params.get('id')
         if entity_id:
             try:
                 entities = get_object_or_404(Entity, pk=entity_id)
-                serializer = EntitySerializer(entities, many=False, fields=('id', 'name', 'logo'))
+                serializer = EntitySerializer(entities, many=False, fields=PUBLIC_ENTITY_FIELDS)
             except ValueError:
                 return Response(status=status.HTTP_400_BAD_REQUEST)
         else:
-            entities = Entity.objects.all()
-            serializer = EntitySerializer(entities, many=True, fields=('id', 'name', 'logo'))
+            sparse = get_sparse_fieldset(request, EntitySerializer, allowed=PUBLIC_ENTITY_FIELDS)
+            entities = EntitySerializer.restrict_queryset(Entity.objects.all(), **sparse)
+            serializer = EntitySerializer(entities, many=True, **sparse)
         return Response(serializer.data)
     
 class EntityPrivate(APIView):
+    query_budget = 8
     @swagger_auto_schema(
             responses={
                 200: openapi.Response("Successful request.", EntitySerializer),
@@ -91,6 +101,7 @@ class EntityPrivate(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
 class EntityJoin(APIView):
+    query_budget = 6
     @swagger_auto_schema(
         request_body=openapi.Schema(
             type=openapi.TYPE_OBJECT,
@@ -124,20 +135,25 @@ class EntityJoin(APIView):
             return Response(status=status.HTTP_401_UNAUTHORIZED)
         
 class DirectoratePositions(APIView):
+    query_budget = 8
     @swagger_auto_schema(
+            manual_parameters=SPARSE_FIELDSET_PARAMETERS[:1],
             responses={
                 200: openapi.Response("Successful request.", DirectoratePositionSerializer),
                 400: openapi.Response("Bad request."),
             }
     )
+    @cache_response()
     def get(self, request, *args, **kwargs):
         """
         Retrieves the existing positions on the user entity.
 
-        Returns an array of DirectoratePositions.
+        Returns an array of DirectoratePositions, with the fields selected by the query param 'fields'.
         """
+        sparse = get_sparse_fieldset(request, DirectoratePositionSerializer)
         positions = DirectoratePosition.objects.filter(entity=request.user.entity.id)
-        serializer = DirectoratePositionSerializer(positions, many=True)
+        positions = DirectoratePositionSerializer.restrict_queryset(positions, **sparse)
+        serializer = DirectoratePositionSerializer(positions, many=True, **sparse)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     @swagger_auto_schema(request_body=DirectoratePositionSerializer)
@@ -199,20 +215,26 @@ class DirectoratePositions(APIView):
             return Response(status=status.HTTP_400_BAD_REQUEST)
         
 class Directorates(APIView):
+    query_budget = 8
     @swagger_auto_schema(
+            manual_parameters=SPARSE_FIELDSET_PARAMETERS,
             responses={
                 200: openapi.Response("Successful request.", DirectorateSerializer),
                 400: openapi.Response("Bad request."),
             }
     )
+    @cache_response()
     def get(self, request, *args, **kwargs):
         """
         Retrieves the entity directorate.
 
-        Returns an array of Directorates.
+        Returns an array of Directorates, with the fields selected by the query param 'fields'.
+        Query param 'expand' returns the user or the position as objects instead of IDs.
         """
+        sparse = get_sparse_fieldset(request, DirectorateSerializer)
         positions = Directorate.objects.filter(entity=request.user.entity.id)
-        serializer = DirectorateSerializer(positions, many=True)
+        positions = DirectorateSerializer.restrict_queryset(positions, **sparse)
+        serializer = DirectorateSerializer(positions, many=True, **sparse)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     @swagger_auto_schema(request_body=DirectorateSerializer)
@@ -280,39 +302,49 @@ class Directorates(APIView):
             return Response(status=status.HTTP_400_BAD_REQUEST)
         
 class CreateYearlyCensus(APIView):
+    # Census entries are inserted in batches, so the queries grow with the roster
+    query_budget = None
     @swagger_auto_schema(responses={
                 200: openapi.Response("Successful request."),
                 401: openapi.Response("User is not entity admin."),
             })
     def post(self, request, *args, **kwargs):
         """ 
-        Generates an excel report of affiliates of the current user entity.
+        Generates the yearly census of the current user entity from its active affiliates.
 
+        If the census of the current year already exists, it is replaced.
         """
         if(request.user.is_entity_admin):
-            YearlyCensus.objects.filter(entity=request.user.entity, year=datetime.datetime.now().year).delete()
-            affiliates = Affiliate.objects.filter(entity=request.user.entity.id, active=True)
-            census = YearlyCensus.objects.create(entity=request.user.entity, year=datetime.datetime.now().year)
-            census.save()
-            for affiliate in affiliates:
-                entry = YearlyCensusEntry.objects.create(
-                    affiliate=affiliate,
-                    jcf_number=affiliate.jcf_number,
-                    census_number=affiliate.census_number,
-                    commission="MAY",
-                    surnames=affiliate.surnames,
-                    name=affiliate.name,
-                    address=affiliate.address,
-                    city=affiliate.city,
-                    postal_code=affiliate.postal_code,
-                    phone=affiliate.phone,
-                    birthday=affiliate.birthday,
-                    gender=affiliate.gender,
-                    document_id=affiliate.document_id,
-                    position=affiliate.position,
-                    reward=""
-                )
-                entry.save()
-                census.entries.add(entry)
+            year = datetime.datetime.now().year
+            affiliates = Affiliate.objects.filter(entity=request.user.entity.id, active=True).with_position()
+            with transaction.atomic():
+                previous = YearlyCensus.objects.filter(entity=request.user.entity, year=year)
+                YearlyCensusEntry.objects.filter(yearlycensus__in=previous).delete()
+                previous.delete()
+                census = YearlyCensus.objects.create(entity=request.user.entity, year=year)
+                entries = YearlyCensusEntry.objects.bulk_create([
+                    YearlyCensusEntry(
+                        affiliate=affiliate,
+                        jcf_number=affiliate.jcf_number,
+                        census_number=affiliate.census_number,
+                        commission="MAY",
+                        surnames=affiliate.surnames,
+                        name=affiliate.name,
+                        address=affiliate.address,
+                        city=affiliate.city,
+                        postal_code=affiliate.postal_code,
+                        phone=affiliate.phone,
+                        birthday=affiliate.birthday,
+                        gender=affiliate.gender,
+                        document_id=affiliate.document_id,
+                        position=affiliate.position,
+                        reward=""
+                    )
+                    for affiliate in affiliates
+                ])
+                CensusEntries = YearlyCensus.entries.through
+                CensusEntries.objects.bulk_create([
+                    CensusEntries(yearlycensus=census, yearlycensusentry=entry) for entry in entries
+                ])
             return Response(status=status.HTTP_201_CREATED)
-        return Response(status=status.HTTP_401_UNAUTHORIZED)
\ No newline at end of file
+        return Response(status=status.HTTP_401_UNAUTHORIZED)
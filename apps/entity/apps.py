@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class EntityConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.entity'
+
+    def ready(self):
+        from . import signals
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.2 on 2026-10-18 15:03
+
+import CENDRA.images
+import apps.entity.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('entity', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='entity',
+            name='logo',
+            field=CENDRA.images.VariantImageField(default='/default_logo.png', upload_to=apps.entity.models.Entity.logo_upload_rename),
+        ),
+    ]
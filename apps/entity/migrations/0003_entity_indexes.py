@@ -0,0 +1,21 @@
+# Generated by Django 4.2.2 on 2026-10-18 15:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('entity', '0002_entity_logo_variants'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='directorateposition',
+            index=models.Index(fields=['entity', 'priority'], name='position_entity_priority'),
+        ),
+        migrations.AddIndex(
+            model_name='yearlycensus',
+            index=models.Index(fields=['entity', 'year'], name='yearlycensus_entity_year'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 import os
 from django.db import models
+from CENDRA.images import VariantImageField
 
 class Entity(models.Model):
     def logo_upload_rename(instance, filename):
@@ -9,7 +10,7 @@ class Entity(models.Model):
     name = models.CharField(max_length=100)
     phone = models.CharField(max_length=9, blank=True)
     email = models.EmailField(blank=True)
-    logo = models.ImageField(default="/default_logo.png", upload_to=logo_upload_rename)
+    logo = VariantImageField(default="/default_logo.png", upload_to=logo_upload_rename)
     business_name = models.CharField(max_length=100, blank=True)
     nif = models.CharField(max_length=9, blank=True)
     registry_number = models.CharField(max_length=100, blank=True)
@@ -44,6 +45,11 @@ class DirectoratePosition(models.Model):
     entity = models.ForeignKey('Entity', on_delete=models.CASCADE, related_name='positions')
     priority = models.IntegerField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['entity', 'priority'], name='position_entity_priority'),
+        ]
+
     def __str__(self):
         return str(self.name)
 
@@ -77,5 +83,10 @@ class YearlyCensus(models.Model):
     entries = models.ManyToManyField(YearlyCensusEntry)
     year = models.IntegerField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['entity', 'year'], name='yearlycensus_entity_year'),
+        ]
+
     def __str__(self):
         return "Censo " + str(self.year)
\ No newline at end of file
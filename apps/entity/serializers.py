@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
-from CENDRA.utils import DynamicFieldsSerializer
+from CENDRA.utils import DynamicFieldsSerializer, ImageVariantField
 from apps.entity.models import Entity, Directorate, DirectoratePosition
 from apps.affiliate.models import Affiliate
 from apps.affiliate.serializers import AffiliateSerializer
@@ -12,6 +12,8 @@ class DirectoratePositionSerializer(DynamicFieldsSerializer):
         exclude = ['entity']
 
 class EntitySerializer(DynamicFieldsSerializer):
+    logo_thumb = ImageVariantField('thumb', source='logo')
+    logo_medium = ImageVariantField('medium', source='logo')
 
     class Meta:
         model = Entity
@@ -19,6 +21,11 @@ class EntitySerializer(DynamicFieldsSerializer):
         depth = 1
 
 class DirectorateSerializer(DynamicFieldsSerializer):
+    expandable_fields = {
+        'user': (AffiliateSerializer, {'fields': ('id', 'name', 'surnames', 'photo_thumb')}),
+        'position': (DirectoratePositionSerializer, {'fields': ('id', 'name', 'priority')}),
+    }
+
     class Meta:
         model = Directorate
         exclude = ['entity']
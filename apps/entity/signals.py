@@ -0,0 +1,37 @@
+from functools import partial
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from CENDRA.cache import PUBLIC_SCOPE, bump_cache_version, entity_scope
+from apps.affiliate.models import Affiliate, PaymentChoice
+from apps.news.models import NewsItem
+from apps.treasury.models import BankAccount, Income, Outcome
+from .models import Entity, DirectoratePosition, Directorate
+
+
+def entity_of_movement(instance):
+    return BankAccount.objects.filter(pk=instance.account_id).values_list('entity', flat=True).first()
+
+# How to find the entity owning an instance of each cached model
+ENTITY_OF = {
+    Entity: lambda instance: instance.pk,
+    Affiliate: lambda instance: instance.entity_id,
+    PaymentChoice: lambda instance: Affiliate.objects.filter(pk=instance.affiliate_id).values_list('entity', flat=True).first(),
+    DirectoratePosition: lambda instance: instance.entity_id,
+    Directorate: lambda instance: instance.entity_id,
+    NewsItem: lambda instance: instance.entity_id,
+    BankAccount: lambda instance: instance.entity_id,
+    Income: entity_of_movement,
+    Outcome: entity_of_movement,
+}
+
+def invalidate_entity_cache(sender, instance, **kwargs):
+    # Bumped once the write is committed: a request reading in between would cache the old data under the new version
+    entity_id = ENTITY_OF[sender](instance)
+    if entity_id is not None:
+        transaction.on_commit(partial(bump_cache_version, entity_scope(entity_id)))
+    if sender is Entity:
+        transaction.on_commit(partial(bump_cache_version, PUBLIC_SCOPE))
+
+for model in ENTITY_OF:
+    post_save.connect(invalidate_entity_cache, sender=model, dispatch_uid='invalidate_entity_cache')
+    post_delete.connect(invalidate_entity_cache, sender=model, dispatch_uid='invalidate_entity_cache')
@@ -1,3 +1,106 @@
+import datetime
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from CENDRA.cache import entity_scope, get_cache_version
+from apps.affiliate.models import Affiliate
+from apps.user.models import CendraUser
+from .models import Entity, DirectoratePosition, Directorate, YearlyCensus, YearlyCensusEntry
 
-# Create your tests here.
+
+class CreateYearlyCensusTests(TestCase):
+    def setUp(self):
+        self.entity = Entity.objects.create(name='Falla', social_address='Calle Mayor 1', postal_code='46001', city='Valencia', province='Valencia')
+        self.position = DirectoratePosition.objects.create(name='Presidente', entity=self.entity, priority=1)
+        user = CendraUser.objects.create_user('admin', 'admin@example.com', 'password', entity=self.entity, is_entity_admin=True)
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def add_affiliates(self, count):
+        Affiliate.objects.bulk_create([
+            Affiliate(entity=self.entity, census_number=i, name='Nombre', surnames='Apellido %d' % i, document_id='%08dA' % i,
+                      birthday=datetime.date(1990, 1, 1), address='Calle', postal_code='46001', city='Valencia', province='Valencia')
+            for i in range(count)
+        ])
+
+    def create_census(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/private/entity/census')
+        self.assertEqual(response.status_code, 201)
+        return len(queries)
+
+    def test_creates_an_entry_per_active_affiliate(self):
+        self.add_affiliates(3)
+        president = Affiliate.objects.first()
+        Directorate.objects.create(user=president, position=self.position, entity=self.entity)
+        Affiliate.objects.filter(census_number=2).update(active=False)
+        self.create_census()
+        census = YearlyCensus.objects.get(entity=self.entity)
+        positions = dict(census.entries.values_list('affiliate', 'position'))
+        self.assertEqual(len(positions), 2)
+        self.assertEqual(positions[president.id], 'Presidente')
+        self.assertIn('Vocal', positions.values())
+
+    def test_replaces_the_census_of_the_year(self):
+        self.add_affiliates(3)
+        self.create_census()
+        self.create_census()
+        self.assertEqual(YearlyCensus.objects.filter(entity=self.entity).count(), 1)
+        self.assertEqual(YearlyCensusEntry.objects.count(), 3)
+
+    def test_query_count_does_not_grow_with_the_roster(self):
+        # Inserts are only split by the database parameter limit, well above this roster size
+        self.add_affiliates(5)
+        self.create_census()
+        small = self.create_census()
+        self.add_affiliates(45)
+        self.create_census()
+        large = self.create_census()
+        self.assertEqual(small, large)
+
+
+class DashboardCacheTests(TestCase):
+    def setUp(self):
+        self.entity = Entity.objects.create(name='Falla', social_address='Calle Mayor 1', postal_code='46001', city='Valencia', province='Valencia')
+        affiliate = self.create_affiliate(1)
+        user = CendraUser.objects.create_user('admin', 'admin@example.com', 'password', entity=self.entity, affiliate=affiliate)
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        cache.clear()
+
+    def create_affiliate(self, census_number):
+        return Affiliate.objects.create(entity=self.entity, census_number=census_number, name='Nombre', surnames='Apellido', document_id='00000001A',
+                                        birthday=datetime.date(1990, 1, 1), address='Calle', postal_code='46001', city='Valencia', province='Valencia')
+
+    def get_members(self):
+        response = self.client.get('/api/private/dashboard')
+        self.assertEqual(response.status_code, 200)
+        return response.data['members']
+
+    def test_writes_invalidate_the_dashboard_once_committed(self):
+        self.assertEqual(self.get_members(), 1)
+        version = get_cache_version(entity_scope(self.entity.pk))
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.create_affiliate(2)
+        # Until the write is committed, other requests keep reading the previous data and version
+        self.assertEqual(get_cache_version(entity_scope(self.entity.pk)), version)
+        self.assertEqual(self.get_members(), 1)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.get_members(), 2)
+
+
+class PublicEntitiesTests(TestCase):
+    def setUp(self):
+        Entity.objects.create(name='Falla', social_address='Calle Mayor 1', postal_code='46001', city='Valencia', province='Valencia')
+        cache.clear()
+
+    def test_fields_narrow_the_output(self):
+        response = APIClient().get('/api/public/entities?fields=id,name')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([set(entity) for entity in response.data], [{'id', 'name'}])
+
+    def test_unknown_fields_are_rejected(self):
+        self.assertEqual(APIClient().get('/api/public/entities?fields=id,join_password').status_code, 400)
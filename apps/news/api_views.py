@@ -4,37 +4,46 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
+from CENDRA.cache import cache_response, conditional_response
+from CENDRA.compiled_serializers import serialize_list
+from CENDRA.utils import SPARSE_FIELDSET_PARAMETERS, get_sparse_fieldset
 from .models import NewsItem
 from .serializers import NewsSerializer
 
 class News(APIView):
+    query_budget = 4
     @swagger_auto_schema(
         manual_parameters=[
             openapi.Parameter('id', openapi.IN_QUERY, description="News item ID to retrieve", type=openapi.TYPE_INTEGER, required=False)
-        ],
+        ] + SPARSE_FIELDSET_PARAMETERS,
         responses={
             200: openapi.Response("Successful request.", NewsSerializer),
             400: openapi.Response("Bad request."),
         }
     )
+    @conditional_response(lambda request: NewsItem.objects.filter(entity=request.user.entity_id))
+    @cache_response()
     def get(self, request, *args, **kwargs):
         """
         Retrieves the News. 
 
-        If query param 'id' is provided, returns only one object.
+        If query param 'id' is provided, returns only one object. Otherwise,
+        query param 'fields' narrows the items to the listed fields and
+        'expand=author' returns their author as an object instead of an ID.
         """
         news_id = self.request.query_params.get('id')
         if news_id:
             try:
                 int(news_id)
-                news = get_object_or_404(NewsItem, pk=news_id, entity=request.user.entity)
-                serializer = NewsSerializer(news, many=False)
+                news = get_object_or_404(NewsItem.objects.select_related('author'), pk=news_id, entity=request.user.entity)
+                data = NewsSerializer(news, many=False).data
             except ValueError:
                 return Response(status=status.HTTP_400_BAD_REQUEST)
         else:
-            news = NewsItem.objects.filter(entity=request.user.entity.id)
-            serializer = NewsSerializer(news, many=True)
-        return Response(serializer.data)
+            sparse = get_sparse_fieldset(request, NewsSerializer)
+            # Joins the author only if authorstr or the expanded author reads it
+            data = serialize_list(NewsSerializer, NewsItem.objects.filter(entity=request.user.entity.id), **sparse)
+        return Response(data)
 
     @swagger_auto_schema(request_body=NewsSerializer)
     def post(self, request, *args, **kwargs):
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.2 on 2026-10-18 15:03
+
+import CENDRA.images
+import apps.news.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='newsitem',
+            name='photo',
+            field=CENDRA.images.VariantImageField(default='/default_photo.png', upload_to=apps.news.models.NewsItem.photo_upload_rename),
+        ),
+    ]
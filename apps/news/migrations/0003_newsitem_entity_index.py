@@ -0,0 +1,17 @@
+# Generated by Django 4.2.2 on 2026-10-18 15:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0002_newsitem_photo_variants'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='newsitem',
+            index=models.Index(fields=['entity', '-created_at', '-id'], name='newsitem_entity_created'),
+        ),
+    ]
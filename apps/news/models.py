@@ -1,5 +1,6 @@
 from django.db import models
 import os
+from CENDRA.images import VariantImageField
 
 class NewsItem(models.Model):
     def photo_upload_rename(instance, filename):
@@ -10,12 +11,15 @@ class NewsItem(models.Model):
     title = models.CharField(max_length=100)
     content = models.TextField()
     author = models.ForeignKey('affiliate.Affiliate', on_delete=models.PROTECT, related_name='news_items')
-    photo = models.ImageField(default="/default_photo.png", upload_to=photo_upload_rename)
+    photo = VariantImageField(default="/default_photo.png", upload_to=photo_upload_rename)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ('-created_at', '-pk')
+        indexes = [
+            models.Index(fields=['entity', '-created_at', '-id'], name='newsitem_entity_created'),
+        ]
 
     def __str__(self):
         return str(self.title)
@@ -1,10 +1,15 @@
 from rest_framework import serializers
-from CENDRA.utils import DynamicFieldsSerializer
+from CENDRA.utils import DynamicFieldsSerializer, ImageVariantField
+from apps.affiliate.serializers import AffiliateSerializer
 from .models import NewsItem
 
 
 class NewsSerializer(DynamicFieldsSerializer):
     authorstr = serializers.CharField()
+    photo_thumb = ImageVariantField('thumb', source='photo')
+    photo_medium = ImageVariantField('medium', source='photo')
+    field_sources = {'authorstr': ('author__name',)}
+    expandable_fields = {'author': (AffiliateSerializer, {'fields': ('id', 'name', 'surnames', 'photo_thumb')})}
 
     class Meta:
         model = NewsItem
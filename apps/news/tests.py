@@ -1,3 +1,123 @@
+import datetime
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from CENDRA.compiled_serializers import compile_serializer
+from apps.affiliate.models import Affiliate
+from apps.entity.models import Entity
+from apps.user.models import CendraUser
+from .models import NewsItem
+from .serializers import NewsSerializer
 
-# Create your tests here.
+
+class NewsCacheTests(TestCase):
+    def setUp(self):
+        self.entity = Entity.objects.create(name='Falla', social_address='Calle Mayor 1', postal_code='46001', city='Valencia', province='Valencia')
+        self.author = Affiliate.objects.create(entity=self.entity, census_number=1, name='Ana', surnames='Pérez', document_id='00000001R', birthday=datetime.date(1990, 1, 1),
+                                               address='Calle', postal_code='46001', city='Valencia', province='Valencia')
+        self.news_item = NewsItem.objects.create(entity=self.entity, author=self.author, title='Fiesta', content='Mañana')
+        self.client = APIClient()
+        self.client.force_authenticate(CendraUser.objects.create_user('admin', 'admin@example.com', 'password', entity=self.entity))
+        cache.clear()
+
+    def get_titles(self):
+        response = self.client.get('/api/private/news')
+        self.assertEqual(response.status_code, 200)
+        return [news_item['title'] for news_item in response.data]
+
+    def test_writes_invalidate_cached_responses(self):
+        self.assertEqual(self.get_titles(), ['Fiesta'])
+        # Queryset updates send no signals, so the cached response is still served
+        NewsItem.objects.update(title='Traca')
+        self.assertEqual(self.get_titles(), ['Fiesta'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.news_item.refresh_from_db()
+            self.news_item.save()
+        self.assertEqual(self.get_titles(), ['Traca'])
+        with self.captureOnCommitCallbacks(execute=True):
+            NewsItem.objects.create(entity=self.entity, author=self.author, title='Cena', content='Hoy')
+        self.assertEqual(self.get_titles(), ['Cena', 'Traca'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.news_item.delete()
+        self.assertEqual(self.get_titles(), ['Cena'])
+
+    def test_other_entities_keep_their_cached_responses(self):
+        other = Entity.objects.create(name='Otra', social_address='Calle Mayor 2', postal_code='46001', city='Valencia', province='Valencia')
+        self.assertEqual(self.get_titles(), ['Fiesta'])
+        NewsItem.objects.update(title='Traca')
+        with self.captureOnCommitCallbacks(execute=True):
+            other.name = 'Otra falla'
+            other.save()
+        self.assertEqual(self.get_titles(), ['Fiesta'])
+
+    def test_if_none_match_is_not_modified_while_the_news_are_unchanged(self):
+        response = self.client.get('/api/private/news')
+        etag = response['ETag']
+        response = self.client.get('/api/private/news', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertNotEqual(self.client.get('/api/private/news?fields=title')['ETag'], etag)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.news_item.title = 'Traca'
+            self.news_item.save()
+        response = self.client.get('/api/private/news', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get('/api/private/news', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+
+class NewsSparseFieldsetTests(TestCase):
+    def setUp(self):
+        entity = Entity.objects.create(name='Falla', social_address='Calle Mayor 1', postal_code='46001', city='Valencia', province='Valencia')
+        self.author = Affiliate.objects.create(entity=entity, census_number=1, name='Ana', surnames='Pérez', document_id='00000001R', birthday=datetime.date(1990, 1, 1),
+                                               address='Calle', postal_code='46001', city='Valencia', province='Valencia')
+        NewsItem.objects.create(entity=entity, author=self.author, title='Fiesta', content='Mañana')
+        self.client = APIClient()
+        self.client.force_authenticate(CendraUser.objects.create_user('admin', 'admin@example.com', 'password', entity=entity))
+        cache.clear()
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, queries[-1]['sql']
+
+    def test_expand_joins_the_relation(self):
+        response, sql = self.get('/api/private/news?fields=title')
+        self.assertEqual(response.data, [{'title': 'Fiesta'}])
+        self.assertNotIn('JOIN', sql)
+        response, sql = self.get('/api/private/news?fields=title&expand=author')
+        self.assertEqual(response.data[0]['author']['surnames'], 'Pérez')
+        self.assertEqual(response.data[0]['author']['id'], self.author.id)
+        self.assertIn('JOIN', sql)
+
+    def test_unknown_relations_are_rejected(self):
+        self.assertEqual(self.client.get('/api/private/news?expand=entity').status_code, 400)
+
+
+class CompiledNewsSerializerTests(TestCase):
+    def test_expanded_output_is_identical(self):
+        entity = Entity.objects.create(name='Falla', social_address='Calle Mayor 1', postal_code='46001', city='Valencia', province='Valencia')
+        author = Affiliate.objects.create(entity=entity, census_number=1, name='Ana', surnames='Pérez', document_id='00000001R', birthday=datetime.date(1990, 1, 1),
+                                          address='Calle', postal_code='46001', city='Valencia', province='Valencia')
+        NewsItem.objects.create(entity=entity, author=author, title='Fiesta', content='Mañana')
+        NewsItem.objects.create(entity=entity, author=author, title='Cena', content='Hoy', photo='news/2/photo.png')
+        news = NewsItem.objects.filter(entity=entity)
+        queryset = NewsSerializer.restrict_queryset(news, expand=('author',))
+        expected = JSONRenderer().render(NewsSerializer(queryset, many=True, expand=('author',)).data)
+        compiled = compile_serializer(NewsSerializer, expand=('author',))
+        self.assertEqual(JSONRenderer().render(compiled.serialize(compiled.values(news))), expected)
+
+    def test_unsupported_fields_are_not_compiled(self):
+        class SummarySerializer(NewsSerializer):
+            summary = serializers.SerializerMethodField()
+
+            def get_summary(self, instance):
+                return instance.content[:10]
+
+        self.assertIsNone(compile_serializer(SummarySerializer))
+        self.assertIsNotNone(compile_serializer(SummarySerializer, fields=('id', 'title')))
@@ -1,23 +1,33 @@
+import datetime
 import logging
+from django.db.models import Sum, Value
 from django.http import Http404
 from django.shortcuts import get_object_or_404
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
+from CENDRA.cache import cache_response
+from CENDRA.compiled_serializers import compile_serializer
+from CENDRA.pagination import KeysetPagination
+from CENDRA.utils import SPARSE_FIELDSET_PARAMETERS, get_sparse_fieldset
 from .models import BankAccount, Income, Outcome
-from .serializers import BankAccountSerializer, IncomeSerializer, OutcomeSerializer
+from .serializers import BankAccountSerializer, TransactionSerializer, TransactionTotalsSerializer
 
 class BankAccounts(APIView):
-    @swagger_auto_schema(responses={200: BankAccountSerializer})
+    query_budget = 6
+    @swagger_auto_schema(manual_parameters=SPARSE_FIELDSET_PARAMETERS[:1], responses={200: BankAccountSerializer})
+    @cache_response()
     def get(self, request, *args, **kwargs):
         """
         Retrieves the BankAccounts. 
 
-        If successful, returns an array of objects.
+        If successful, returns an array of objects, with the fields selected by the query param 'fields'.
         """
-        accounts = BankAccount.objects.filter(entity=request.user.entity.id)
-        serializer = BankAccountSerializer(accounts, many=True)
+        sparse = get_sparse_fieldset(request, BankAccountSerializer)
+        accounts = BankAccountSerializer.restrict_queryset(BankAccount.objects.filter(entity=request.user.entity.id), **sparse)
+        serializer = BankAccountSerializer(accounts, many=True, **sparse)
         return Response(serializer.data)
 
     def post(self, request, *args, **kwargs):
@@ -33,12 +43,62 @@ class BankAccounts(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
 class Transactions(APIView):
+    query_budget = 6
+    ordering = ('date', 'created_at', 'type', 'id')
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('account', openapi.IN_QUERY, description="Bank account ID", type=openapi.TYPE_INTEGER, required=True),
+            openapi.Parameter('from', openapi.IN_QUERY, description="First date to include (YYYY-MM-DD)", type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE, required=False),
+            openapi.Parameter('to', openapi.IN_QUERY, description="Last date to include (YYYY-MM-DD)", type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE, required=False),
+            openapi.Parameter('cursor', openapi.IN_QUERY, description="Cursor returned as 'next' by the previous page", type=openapi.TYPE_STRING, required=False),
+            openapi.Parameter('page_size', openapi.IN_QUERY, description="Number of transactions per page", type=openapi.TYPE_INTEGER, required=False)
+        ] + SPARSE_FIELDSET_PARAMETERS[:1],
+        responses={
+            200: openapi.Response("Successful request.", TransactionSerializer),
+            400: openapi.Response("Bad request."),
+        }
+    )
     def get(self, request, *args, **kwargs):
-        account_id = self.request.query_params.get('account')
+        """
+        Retrieves the incomes and outcomes of a bank account as a single feed.
+
+        Transactions are ordered by date and paginated by cursor. The response holds
+        the page 'results', the 'next' page URL, if any, and the 'totals' of the
+        whole period selected with the query params 'from' and 'to'. Query param
+        'fields' narrows the transactions to the listed fields.
+        """
+        sparse = get_sparse_fieldset(request, TransactionSerializer)
+        try:
+            account_id = int(self.request.query_params.get('account'))
+            date_from = self.request.query_params.get('from')
+            date_to = self.request.query_params.get('to')
+            period = {}
+            if date_from:
+                period['date__gte'] = datetime.date.fromisoformat(date_from)
+            if date_to:
+                period['date__lte'] = datetime.date.fromisoformat(date_to)
+        except (TypeError, ValueError):
+            return Response(status=status.HTTP_400_BAD_REQUEST)
         account = get_object_or_404(BankAccount, pk=account_id, entity=request.user.entity)
-        incomes = Income.objects.filter(account=account)
-        outcomes = Outcome.objects.filter(account=account)
-        income_serializer = IncomeSerializer(incomes, many=True)
-        outcome_serializer = OutcomeSerializer(outcomes, many=True)
-        transactions = {'incomes': income_serializer.data, 'outcomes': outcome_serializer.data}
-        return Response(transactions)
+
+        # Both sides of the union select the same columns, including the ordering ones read by the cursor
+        compiled = compile_serializer(TransactionSerializer, **sparse)
+        paginator = KeysetPagination(ordering=self.ordering)
+        position = paginator.decode_cursor(request)
+        feed = []
+        totals = {}
+        for model, kind in ((Income, 'income'), (Outcome, 'outcome')):
+            movements = model.objects.filter(account=account, **period)
+            totals[kind] = movements.aggregate(total=Sum('amount'))['total'] or 0
+            movements = compiled.values(movements.annotate(type=Value(kind)), extra=self.ordering)
+            feed.append(paginator.apply_cursor(movements, position))
+        page = paginator.paginate_ordered(feed[0].union(feed[1], all=True).order_by(*self.ordering), request)
+
+        response = paginator.get_paginated_response(compiled.serialize(page))
+        response.data['totals'] = TransactionTotalsSerializer({
+            'incomes': totals['income'],
+            'outcomes': totals['outcome'],
+            'net': totals['income'] + totals['outcome'],
+        }).data
+        return response
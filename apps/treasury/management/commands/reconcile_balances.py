@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from django.db.models.functions import Round
+from apps.treasury.models import BankAccount
+
+
+class Command(BaseCommand):
+    help = 'Checks the stored balance of every bank account against its full history and repairs any drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report the drifted accounts, without repairing them.')
+
+    def handle(self, *args, **options):
+        # Both sides rounded to cents, SQLite adds up decimals as floating point numbers
+        accounts = BankAccount.objects.annotate(stored=Round('balance', 2), expected=BankAccount.expected_balance()).exclude(stored=F('expected'))
+        drifted = list(accounts.values_list('pk', 'name', 'balance', 'expected'))
+        for pk, name, balance, expected in drifted:
+            self.stdout.write('Account {0} ({1}): stored {2}, expected {3}'.format(pk, name, balance, expected))
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('All balances are consistent.'))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING('{0} balances drifted.'.format(len(drifted))))
+        else:
+            # Recomputed inside the UPDATE itself, so concurrent movements are not lost
+            BankAccount.objects.filter(pk__in=[row[0] for row in drifted]).update(balance=BankAccount.expected_balance())
+            self.stdout.write(self.style.SUCCESS('{0} balances repaired.'.format(len(drifted))))
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.2 on 2026-10-18 14:57
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce, Round
+
+
+def compute_balances(apps, schema_editor):
+    BankAccount = apps.get_model('treasury', 'BankAccount')
+
+    def total(model_name):
+        model = apps.get_model('treasury', model_name)
+        movements = model.objects.filter(account=models.OuterRef('pk')).order_by().values('account').annotate(total=models.Sum('amount')).values('total')
+        return Coalesce(models.Subquery(movements), models.Value(0), output_field=models.DecimalField(max_digits=12, decimal_places=2))
+
+    BankAccount.objects.update(balance=Round(models.F('initial_amount') + total('Income') + total('Outcome'), 2))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('treasury', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bankaccount',
+            name='balance',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.RunPython(compute_balances, migrations.RunPython.noop),
+    ]
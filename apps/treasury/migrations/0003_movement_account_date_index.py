@@ -0,0 +1,21 @@
+# Generated by Django 4.2.2 on 2026-10-18 14:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('treasury', '0002_bankaccount_balance'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='income',
+            index=models.Index(fields=['account', 'date', 'created_at', 'id'], name='treasury_income_account_date'),
+        ),
+        migrations.AddIndex(
+            model_name='outcome',
+            index=models.Index(fields=['account', 'date', 'created_at', 'id'], name='treasury_outcome_account_date'),
+        ),
+    ]
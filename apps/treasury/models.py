@@ -1,6 +1,9 @@
-from django.db import models
+from django.db import models, transaction
 import re
 from django.core.exceptions import ValidationError
+from django.db.models.functions import Coalesce, Round
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 
 class BankAccount(models.Model):
     def validate_iban(value):
@@ -10,35 +13,85 @@ class BankAccount(models.Model):
         iban_regex = r'^[A-Z]{2}\d{2}[A-Z\d]{4}\d{10}$'
         if not re.match(iban_regex, value):
             raise ValidationError('Invalid IBAN number')
-    
+
     entity = models.ForeignKey('entity.Entity', on_delete=models.CASCADE)
     name = models.CharField(max_length=100)
     iban = models.CharField(max_length=100, null=True, blank=True, validators=[validate_iban])
     initial_amount = models.DecimalField(max_digits=6, decimal_places=2, default=0.0)
+    # Running balance, kept up to date by Income and Outcome writes
+    balance = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
 
     def __str__(self):
         return self.name
 
-    @property
-    def balance(self):
-        incomes = Income.objects.filter(account=self.id).aggregate(models.Sum('amount'))['amount__sum']
-        outcomes = Outcome.objects.filter(account=self.id).aggregate(models.Sum('amount'))['amount__sum']
-        if incomes is None:
-            incomes = 0
-        if outcomes is None:
-            outcomes = 0
-        return self.initial_amount + incomes + outcomes
-
-class Income(models.Model):
-    account = models.ForeignKey('BankAccount', on_delete=models.CASCADE)
-    concept = models.CharField(max_length=100)
-    amount = models.DecimalField(max_digits=6, decimal_places=2)
-    date = models.DateField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.balance = self.initial_amount
+            super(BankAccount, self).save(*args, **kwargs)
+            return
+        # Never write the balance from a possibly stale instance, only through F() updates
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            update_fields = [field.name for field in self._meta.concrete_fields if not field.primary_key]
+        kwargs['update_fields'] = [name for name in update_fields if name != 'balance']
+        with transaction.atomic():
+            previous = BankAccount.objects.select_for_update().filter(pk=self.pk).values_list('initial_amount', flat=True).first()
+            super(BankAccount, self).save(*args, **kwargs)
+            if previous is not None and 'initial_amount' in kwargs['update_fields']:
+                BankAccount.objects.filter(pk=self.pk).update(balance=models.F('balance') + models.F('initial_amount') - previous)
+        self.refresh_from_db(fields=['balance'])
+
+    @classmethod
+    def expected_balance(cls):
+        """
+        Expression computing the balance of each account from its full history.
 
-class Outcome(models.Model):
+        Rounded to cents, as SQLite adds up decimals as floating point numbers.
+        """
+        output_field = models.DecimalField(max_digits=12, decimal_places=2)
+        def total(model):
+            movements = model.objects.filter(account=models.OuterRef('pk')).order_by().values('account').annotate(total=models.Sum('amount')).values('total')
+            return Coalesce(models.Subquery(movements), models.Value(0), output_field=output_field)
+        return Round(models.F('initial_amount') + total(Income) + total(Outcome), 2, output_field=output_field)
+
+class Movement(models.Model):
     account = models.ForeignKey('BankAccount', on_delete=models.CASCADE)
     concept = models.CharField(max_length=100)
     amount = models.DecimalField(max_digits=6, decimal_places=2)
     date = models.DateField()
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        abstract = True
+        indexes = [
+            models.Index(fields=['account', 'date', 'created_at', 'id'], name='%(app_label)s_%(class)s_account_date'),
+        ]
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            previous = None
+            if not self._state.adding:
+                # Locked, so concurrent edits of the movement do not both undo the same previous amount
+                previous = type(self).objects.select_for_update().filter(pk=self.pk).values_list('account', 'amount').first()
+            super(Movement, self).save(*args, **kwargs)
+            amount = self._meta.get_field('amount').to_python(self.amount)
+            if previous is not None:
+                account_id, previous_amount = previous
+                if account_id == self.account_id:
+                    amount -= previous_amount
+                else:
+                    BankAccount.objects.filter(pk=account_id).update(balance=models.F('balance') - previous_amount)
+            if amount:
+                BankAccount.objects.filter(pk=self.account_id).update(balance=models.F('balance') + amount)
+
+class Income(Movement):
+    pass
+
+class Outcome(Movement):
+    pass
+
+@receiver(post_delete, sender=Income)
+@receiver(post_delete, sender=Outcome)
+def remove_movement_from_balance(sender, instance, **kwargs):
+    # Also runs for queryset and cascade deletes, inside the deletion transaction
+    BankAccount.objects.filter(pk=instance.account_id).update(balance=models.F('balance') - instance.amount)
@@ -1,12 +1,8 @@
 from rest_framework import serializers
+from CENDRA.utils import DynamicFieldsMixin, DynamicFieldsSerializer
 from .models import BankAccount, Income, Outcome
 
-class BankAccountSerializer(serializers.ModelSerializer):
-    balance = serializers.DecimalField(max_digits=6, decimal_places=2)
-
-    def get_balance(self, instance):
-        return self.get_balance
-    
+class BankAccountSerializer(DynamicFieldsSerializer):
     class Meta:
         model = BankAccount
         fields = [
@@ -25,4 +21,17 @@ class IncomeSerializer(serializers.ModelSerializer):
 class OutcomeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Outcome
-        exclude = ['account']
\ No newline at end of file
+        exclude = ['account']
+
+class TransactionSerializer(DynamicFieldsMixin, serializers.Serializer):
+    id = serializers.IntegerField()
+    type = serializers.ChoiceField(choices=['income', 'outcome'])
+    concept = serializers.CharField()
+    amount = serializers.DecimalField(max_digits=6, decimal_places=2)
+    date = serializers.DateField()
+    created_at = serializers.DateTimeField()
+
+class TransactionTotalsSerializer(serializers.Serializer):
+    incomes = serializers.DecimalField(max_digits=12, decimal_places=2)
+    outcomes = serializers.DecimalField(max_digits=12, decimal_places=2)
+    net = serializers.DecimalField(max_digits=12, decimal_places=2)
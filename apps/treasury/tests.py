@@ -1,3 +1,107 @@
+import base64
+import datetime
+import io
+import json
+from decimal import Decimal
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from apps.entity.models import Entity
+from apps.user.models import CendraUser
+from .models import BankAccount, Income, Outcome
 
-# Create your tests here.
+
+class TransactionsTests(TestCase):
+    def setUp(self):
+        entity = Entity.objects.create(name='Falla', social_address='Calle Mayor 1', postal_code='46001', city='Valencia', province='Valencia')
+        self.account = BankAccount.objects.create(entity=entity, name='Caja')
+        other = BankAccount.objects.create(entity=entity, name='Banco')
+        for day in (1, 2, 2, 3):
+            Income.objects.create(account=self.account, concept='Cuota', amount=10, date=datetime.date(2023, 1, day))
+        for day in (2, 2, 4):
+            Outcome.objects.create(account=self.account, concept='Traca', amount=-5, date=datetime.date(2023, 1, day))
+        Income.objects.create(account=other, concept='Cuota', amount=10, date=datetime.date(2023, 1, 2))
+        # Same timestamps on both sides, and the same ids in both tables, so only 'type' and 'id' break ties
+        Income.objects.update(created_at=timezone.now())
+        Outcome.objects.update(created_at=timezone.now())
+        self.client = APIClient()
+        self.client.force_authenticate(CendraUser.objects.create_user('admin', 'admin@example.com', 'password', entity=entity))
+        cache.clear()
+
+    def get_pages(self, url):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([(transaction['type'], transaction['id']) for transaction in response.data['results']])
+            url = response.data['next']
+        return pages
+
+    def test_pages_neither_overlap_nor_skip_rows(self):
+        url = '/api/private/treasury/transactions?account={0}'.format(self.account.id)
+        whole = self.get_pages(url)
+        self.assertEqual(len(whole), 1)
+        expected = sorted(
+            [(movement.date, 'income', movement.id) for movement in Income.objects.filter(account=self.account)]
+            + [(movement.date, 'outcome', movement.id) for movement in Outcome.objects.filter(account=self.account)]
+        )
+        self.assertEqual(whole[0], [(kind, pk) for _, kind, pk in expected])
+        for page_size in (1, 2, 3):
+            with self.subTest(page_size=page_size):
+                pages = self.get_pages(url + '&page_size={0}'.format(page_size))
+                self.assertEqual(sum(pages, []), whole[0])
+                self.assertTrue(all(len(page) == page_size for page in pages[:-1]))
+
+    def test_totals_cover_the_whole_period(self):
+        response = self.client.get('/api/private/treasury/transactions', {'account': self.account.id, 'to': '2023-01-02', 'page_size': 1})
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['totals'], {'incomes': '30.00', 'outcomes': '-10.00', 'net': '20.00'})
+
+    def test_malformed_cursors_are_rejected(self):
+        def encode(position):
+            return base64.urlsafe_b64encode(json.dumps(position).encode('ascii')).decode('ascii')
+
+        cursors = (
+            'not base64!',
+            encode(['2023-01-02', None, 'income']),
+            encode(['2023-02-30', None, 'income', 1]),
+            encode(['2023-01-02', 'yesterday', 'income', 1]),
+            encode(['2023-01-02', None, 'income', 'one']),
+        )
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                response = self.client.get('/api/private/treasury/transactions', {'account': self.account.id, 'cursor': cursor})
+                self.assertEqual(response.status_code, 400)
+
+
+class ReconcileBalancesTests(TestCase):
+    def setUp(self):
+        entity = Entity.objects.create(name='Falla', social_address='Calle Mayor 1', postal_code='46001', city='Valencia', province='Valencia')
+        self.account = BankAccount.objects.create(entity=entity, name='Caja', initial_amount=Decimal('100.10'))
+        # Amounts without an exact binary representation, whose floating point sums drift
+        for i in range(200):
+            Income.objects.create(account=self.account, concept='Cuota', amount=Decimal('18.84') + i % 7, date=datetime.date(2023, 1, 1))
+            Outcome.objects.create(account=self.account, concept='Traca', amount=Decimal('-0.33') - i % 3, date=datetime.date(2023, 1, 1))
+
+    def reconcile(self, *args):
+        output = io.StringIO()
+        call_command('reconcile_balances', *args, stdout=output)
+        return output.getvalue()
+
+    def test_movements_keep_the_balance_consistent(self):
+        income = Income.objects.first()
+        income.amount = Decimal('0.07')
+        income.save()
+        Outcome.objects.last().delete()
+        self.assertEqual(self.reconcile('--dry-run'), 'All balances are consistent.\n')
+        self.account.refresh_from_db()
+        expected = BankAccount.objects.annotate(expected=BankAccount.expected_balance()).values_list('expected', flat=True).get(pk=self.account.pk)
+        self.assertEqual(self.account.balance, expected)
+
+    def test_repairs_drifted_balances(self):
+        BankAccount.objects.filter(pk=self.account.pk).update(balance=0)
+        self.assertIn('1 balances drifted', self.reconcile('--dry-run'))
+        self.assertIn('1 balances repaired', self.reconcile())
+        self.assertEqual(self.reconcile('--dry-run'), 'All balances are consistent.\n')
@@ -3,12 +3,15 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny
+from CENDRA.async_views import AsyncAPIView, run_blocking
+from apps.affiliate.models import Affiliate
 from apps.entity.models import Entity
 from apps.affiliate.serializers import AffiliateSerializer
 from apps.user.serializers import UserRegisterSerializer, UserUpdateSerializer, UserSerializer
 from rest_framework.authtoken.models import Token
 
 class UserRegister(APIView):
+    query_budget = 10
     permission_classes = [AllowAny]
 
     def post(self, request, *args, **kwargs):
@@ -25,6 +28,7 @@ class UserRegister(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class UserRegisterAffiliate(APIView):
+    query_budget = 10
     def post(self, request, *args, **kwargs):
         data = request.data
         
@@ -45,10 +49,16 @@ class UserRegisterAffiliate(APIView):
         print(serializer.errors)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class UserPrivate(APIView):
-    def get(self, request, *args, **kwargs):
-        serializer = UserSerializer(request.user)
-        return Response(serializer.data)
+def serialize_user(user):
+    if user.affiliate_id:
+        # Load the payment choice and position along with the affiliate
+        user.affiliate = Affiliate.objects.select_related('payment_choice').with_position().get(pk=user.affiliate_id)
+    return UserSerializer(user).data
+
+class UserPrivate(AsyncAPIView):
+    query_budget = 8
+    async def get(self, request, *args, **kwargs):
+        return Response(await run_blocking(serialize_user, request.user))
 
     def patch(self, request, *args, **kwargs):
         """
@@ -0,0 +1,29 @@
+import time
+from django.contrib.auth.hashers import get_hashers
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Measures how long the configured password hashers take to check a password.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=5, help='Number of password checks per hasher.')
+        parser.add_argument('--target-ms', type=float, default=50, help='Desired check time, used to suggest a PBKDF2 iteration count.')
+
+    def handle(self, *args, **options):
+        for hasher in get_hashers():
+            try:
+                encoded = hasher.encode('benchmark-password', hasher.salt())
+            except (ValueError, ImportError):
+                self.stdout.write('{0}: not available'.format(hasher.algorithm))
+                continue
+            start = time.perf_counter()
+            for _ in range(options['rounds']):
+                hasher.verify('benchmark-password', encoded)
+            elapsed = (time.perf_counter() - start) * 1000 / options['rounds']
+            line = '{0}: {1:.1f} ms per check'.format(hasher.algorithm, elapsed)
+            iterations = getattr(hasher, 'iterations', None)
+            if iterations and hasher.algorithm.startswith('pbkdf2'):
+                suggested = int(iterations * options['target_ms'] / elapsed)
+                line += ' with {0} iterations, {1} for {2:g} ms'.format(iterations, suggested, options['target_ms'])
+            self.stdout.write(line)
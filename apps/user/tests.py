@@ -1,3 +1,90 @@
-from django.test import TestCase
+import base64
+from unittest import mock
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, check_password, make_password
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from CENDRA.authentication import credentials_cache, token_cache
+from CENDRA.hashers import TunedPBKDF2PasswordHasher
+from apps.entity.models import Entity
+from .models import CendraUser
 
-# Create your tests here.
+
+class AuthenticationCacheTests(TestCase):
+    def setUp(self):
+        self.entity = Entity.objects.create(name='Falla', social_address='Calle Mayor 1', postal_code='46001', city='Valencia', province='Valencia')
+        self.user = CendraUser.objects.create_user('admin', 'admin@example.com', 'password', entity=self.entity)
+        self.token = Token.objects.create(user=self.user)
+        token_cache.clear()
+        credentials_cache.clear()
+
+    def get(self, authorization):
+        return APIClient().get('/api/private/user', HTTP_AUTHORIZATION=authorization).status_code
+
+    def basic(self, password):
+        return 'Basic ' + base64.b64encode('admin@example.com:{0}'.format(password).encode('utf-8')).decode('ascii')
+
+    def test_password_change_evicts_the_cached_credentials(self):
+        self.assertEqual(self.get(self.basic('password')), 200)
+        # Queryset updates send no signals, so the verified credentials are still cached
+        CendraUser.objects.filter(pk=self.user.pk).update(password=make_password('changed'))
+        self.assertEqual(self.get(self.basic('password')), 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password('changed')
+            self.user.save()
+        self.assertEqual(self.get(self.basic('password')), 401)
+        self.assertEqual(self.get(self.basic('changed')), 200)
+
+    def test_token_deletion_evicts_the_cached_token(self):
+        authorization = 'Token ' + self.token.key
+        self.assertEqual(self.get(authorization), 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+        self.assertEqual(self.get(authorization), 401)
+
+    def test_deactivation_evicts_the_cached_user(self):
+        self.assertEqual(self.get('Token ' + self.token.key), 200)
+        self.assertEqual(self.get(self.basic('password')), 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.get('Token ' + self.token.key), 401)
+        self.assertEqual(self.get(self.basic('password')), 401)
+
+    def test_user_deletion_evicts_the_cached_user(self):
+        self.assertEqual(self.get(self.basic('password')), 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        self.assertEqual(self.get(self.basic('password')), 401)
+
+    def test_entity_changes_reach_the_cached_user(self):
+        self.assertEqual(APIClient().get('/api/private/entity', HTTP_AUTHORIZATION='Token ' + self.token.key).data['name'], 'Falla')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.entity.name = 'Falla Mayor'
+            self.entity.save()
+        self.assertEqual(APIClient().get('/api/private/entity', HTTP_AUTHORIZATION='Token ' + self.token.key).data['name'], 'Falla Mayor')
+
+
+@override_settings(PASSWORD_HASHERS=['CENDRA.hashers.TunedPBKDF2PasswordHasher', 'django.contrib.auth.hashers.PBKDF2PasswordHasher'])
+@mock.patch.object(TunedPBKDF2PasswordHasher, 'iterations', 1000)
+class TunedPBKDF2PasswordHasherTests(TestCase):
+    def test_hashes_with_other_iterations_are_reencoded(self):
+        encoded = PBKDF2PasswordHasher().encode('password', 'salt', iterations=2000)
+        setter = mock.Mock()
+        self.assertTrue(check_password('password', encoded, setter))
+        setter.assert_called_once_with('password')
+        self.assertTrue(make_password('password').startswith('pbkdf2_sha256$1000$'))
+
+    def test_hashes_with_the_tuned_iterations_are_kept(self):
+        encoded = make_password('password')
+        setter = mock.Mock()
+        self.assertTrue(check_password('password', encoded, setter))
+        self.assertFalse(check_password('other', encoded, setter))
+        setter.assert_not_called()
+
+    def test_login_upgrades_the_stored_hash(self):
+        user = CendraUser.objects.create(username='admin', email='admin@example.com', password=PBKDF2PasswordHasher().encode('password', 'salt', iterations=2000))
+        self.assertTrue(user.check_password('password'))
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+        self.assertTrue(user.check_password('password'))